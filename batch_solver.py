@@ -0,0 +1,184 @@
+import numpy as np
+from typing import Tuple
+from solver import count_solutions, sudoku_solver
+
+
+def _box_view(cells: np.array) -> np.array:
+    """
+    :param cells: boolean array of shape (N, 9, 9, 9) indexed by [puzzle, row, column, value - 1]
+    :return: view of shape (N, 3, 3, 3, 3, 9) indexed by [puzzle, box row, row in box, box column, column in box, value - 1]
+    """
+
+    return cells.reshape(len(cells), 3, 3, 3, 3, 9)
+
+
+def _unit_counts(candidates: np.array):
+    """
+    Count for every unit and value how many cells of the unit still have the value as an option
+
+    :param candidates: boolean array of shape (N, 9, 9, 9)
+    :return: tuple of the row counts (N, 9, 9), column counts (N, 9, 9) and box counts (N, 3, 3, 9)
+    """
+
+    return candidates.sum(axis=2), candidates.sum(axis=1), _box_view(candidates).sum(axis=(2, 4))
+
+
+def _spread(row_values: np.array, column_values: np.array, box_values: np.array) -> tuple:
+    """
+    Broadcast per unit arrays back onto the cells of their units
+
+    :param row_values: array of shape (N, 9, 9) indexed by [puzzle, row, value - 1]
+    :param column_values: array of shape (N, 9, 9) indexed by [puzzle, column, value - 1]
+    :param box_values: array of shape (N, 3, 3, 9) indexed by [puzzle, box row, box column, value - 1]
+    :return: tuple of three arrays broadcastable to (N, 9, 9, 9)
+    """
+
+    n = len(row_values)
+    box_cells = np.broadcast_to(box_values[:, :, None, :, None, :], (n, 3, 3, 3, 3, 9)).reshape(n, 9, 9, 9)
+    return row_values[:, :, None, :], column_values[:, None, :, :], box_cells
+
+
+def _initial_candidates(puzzles: np.array) -> tuple:
+    """
+    Build the candidate tensor of a stack of puzzles and find the puzzles whose clues clash
+
+    :param puzzles: numpy array of N x 9 x 9 puzzles, 0 for empty cells
+    :return: tuple of the (N, 9, 9, 9) boolean candidate tensor and a boolean array of the N puzzles that are invalid
+    """
+
+    # One-hot encode the clues, clue cells only have their own value as an option
+    clues = puzzles[..., None] == np.arange(1, 10)
+    # Two clues with the same value in a unit means the puzzle is invalid.
+    # Every count array has 81 entries per puzzle, which is spelled out so that an empty stack still reshapes
+    invalid = np.zeros(len(puzzles), dtype=bool)
+    for counts in _unit_counts(clues):
+        invalid |= (counts > 1).reshape(len(puzzles), 81).any(axis=1)
+
+    # Empty cells can take any value that isn't a clue in the same row, column or box
+    in_row, in_column, in_box = _spread(*(counts > 0 for counts in _unit_counts(clues)))
+    empty = (puzzles == 0)[..., None]
+    candidates = np.where(empty, ~(in_row | in_column | in_box), clues)
+    return candidates, invalid
+
+
+def _propagate(candidates: np.array) -> np.array:
+    """
+    Run one round of propagation on every puzzle at once:
+    remove the value of every cell with a single option from its peers, then give a cell the value that only fits in that cell of a unit (hidden single).
+
+    :param candidates: boolean array of shape (N, 9, 9, 9)
+    :return: the propagated candidate tensor
+    """
+
+    fixed = candidates & (candidates.sum(axis=3) == 1)[..., None]
+    fixed_row, fixed_column, fixed_box = _spread(fixed.any(axis=2), fixed.any(axis=1), _box_view(fixed).any(axis=(2, 4)))
+    # Every cell keeps its own fixed value but loses the values fixed in its row, column or box
+    candidates = candidates & ~(fixed_row | fixed_column | fixed_box) | fixed
+
+    single_row, single_column, single_box = _spread(*(counts == 1 for counts in _unit_counts(candidates)))
+    hidden = candidates & (single_row | single_column | single_box)
+    # A cell that is the only place for two values keeps both, which is caught as a contradiction afterwards
+    return np.where(hidden.any(axis=3)[..., None], hidden, candidates)
+
+
+def _contradictions(candidates: np.array) -> np.array:
+    """
+    :param candidates: boolean array of shape (N, 9, 9, 9)
+    :return: boolean array of the N puzzles that have a cell without options, a value without a place in a unit, or the same value fixed twice in a unit
+    """
+
+    n = len(candidates)
+    counts = candidates.sum(axis=3)
+    dead = (counts == 0).reshape(n, 81).any(axis=1)
+    for unit_counts in _unit_counts(candidates):
+        dead |= (unit_counts == 0).reshape(n, 81).any(axis=1)
+    fixed = candidates & (counts == 1)[..., None]
+    for unit_counts in _unit_counts(fixed):
+        dead |= (unit_counts > 1).reshape(n, 81).any(axis=1)
+    return dead
+
+
+def _propagate_batch(puzzles: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Propagate every puzzle of a stack until it stops changing or hits a contradiction
+
+    :param puzzles: numpy array of N x 9 x 9 puzzles, 0 for empty cells
+    :return: tuple of the propagated (N, 9, 9, 9) candidate tensor, the N puzzles that are dead and the N puzzles that propagation solved
+    """
+
+    candidates, dead = _initial_candidates(puzzles)
+    # Puzzles still being propagated, the others are dead or have stopped changing
+    active = ~dead
+    while active.any():
+        before = candidates[active]
+        after = _propagate(before)
+        candidates[active] = after
+
+        active_indexes = np.flatnonzero(active)
+        dead_now = _contradictions(after)
+        dead[active_indexes[dead_now]] = True
+        # Keep going with the puzzles that changed this round and aren't dead
+        changed = (before != after).reshape(len(after), 729).any(axis=1)
+        active[active_indexes[dead_now | ~changed]] = False
+
+    solved = ~dead & (candidates.sum(axis=3) == 1).reshape(len(puzzles), 81).all(axis=1)
+    return candidates, dead, solved
+
+
+def _filled_cells(candidates: np.array, dtype: np.dtype) -> np.array:
+    """
+    :param candidates: boolean array of shape (9, 9, 9) of a single puzzle
+    :param dtype: dtype of the board to return
+    :return: 9 x 9 board of the cells propagation has fixed, 0 for the others
+    """
+
+    return np.where(candidates.sum(axis=2) == 1, candidates.argmax(axis=2) + 1, 0).astype(dtype)
+
+
+def solve_batch(puzzles: np.ndarray, strategy: str = "trail", **options) -> np.ndarray:
+    """
+    Solve a stack of puzzles, propagating all of them at once with vectorised numpy operations on a (N, 9, 9, 9) boolean candidate tensor.
+    Only the puzzles that propagation can't finish are handed to sudoku_solver one at a time, starting from the cells propagation has filled in.
+
+    :param puzzles: numpy array of N x 9 x 9 puzzles, 0 for empty cells
+    :param strategy: search strategy sudoku_solver uses on the puzzles that still need branching
+    :param options: extra keyword arguments for sudoku_solver
+    :return: numpy array of N x 9 x 9 solutions with the dtype of puzzles (made signed if it isn't, e.g. int16 for uint8), every entry is -1 for puzzles without a solution
+    """
+
+    puzzles = np.asarray(puzzles)
+    candidates, dead, solved = _propagate_batch(puzzles)
+
+    # An unsigned dtype can't hold the -1 of unsolvable puzzles, so the solutions get the smallest signed dtype that holds both
+    solutions = np.full(puzzles.shape, -1, dtype=np.result_type(puzzles.dtype, np.int8))
+    solutions[solved] = candidates[solved].argmax(axis=3) + 1
+
+    # Whatever is left needs search, give the solver every cell propagation has already filled in
+    for i in np.flatnonzero(~dead & ~solved):
+        solutions[i] = sudoku_solver(_filled_cells(candidates[i], puzzles.dtype), strategy=strategy, **options)
+    return solutions
+
+
+def count_batch(puzzles: np.ndarray, limit: int = 2, **options) -> np.ndarray:
+    """
+    Count the solutions of every puzzle of a stack, e.g. to check that every puzzle of a .npy file has a unique solution.
+    Propagation only makes forced moves, so a puzzle it finishes has exactly one solution and one it kills has none,
+    only the rest are counted one at a time with count_solutions.
+
+    :param puzzles: numpy array of N x 9 x 9 puzzles, 0 for empty cells
+    :param limit: number of solutions to stop counting at for each puzzle, 2 is enough to tell unique puzzles apart, or None to count them all
+    :param options: extra keyword arguments for count_solutions
+    :return: numpy array of the N solution counts, each at most limit
+    """
+
+    # Puzzles finished by propagation are counted without calling count_solutions, so the limit is checked here too
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit has to be at least 1 or None, got {limit}")
+    puzzles = np.asarray(puzzles)
+    candidates, dead, solved = _propagate_batch(puzzles)
+
+    counts = np.zeros(len(puzzles), dtype=np.int64)
+    counts[solved] = 1
+    for i in np.flatnonzero(~dead & ~solved):
+        counts[i] = count_solutions(_filled_cells(candidates[i], puzzles.dtype), limit=limit, **options)
+    return counts
@@ -0,0 +1,575 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List
+from batch_solver import count_batch, solve_batch
+from board_functions import board_geometry, box_size_of
+from constraint_propagation import RULES
+from parallel_solver import ParallelSolver
+from search_stats import SearchStats
+from solution_cache import SolutionCache, canonicalize, random_transform
+from solver import count_solutions, sudoku_solver
+from text_format import npy_to_text, read_puzzles, solve_text_file, text_to_npy, write_puzzles
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is then not reported
+    resource = None
+
+# Solver configurations run by the benchmark, as keyword arguments for sudoku_solver
+CONFIGURATIONS = {
+    "dfs": {"strategy": "dfs"},
+    "trail": {"strategy": "trail"},
+    "trail_mrv": {"strategy": "trail", "variable_ordering": "mrv"},
+    "dlx": {"engine": "dlx"},
+    # Depth-first search without any propagation rules, so the search itself has to find every cell
+    "dfs_no_rules": {"strategy": "dfs", "rules": ()},
+}
+
+DIFFICULTIES = ["very_easy", "easy", "medium", "hard"]
+
+# Metrics compared against the baseline, and whether a higher value is better for them
+COMPARED_METRICS = {
+    "correct": True,
+    "p95": False,
+    "puzzles_per_second": True,
+    "nodes": False,
+    "propagate_calls": False,
+}
+
+
+def peak_rss_kib() -> float:
+    """
+    :return: peak resident set size of this process in KiB, or None where the resource module isn't available
+    """
+
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss /= 1024
+    return peak_rss
+
+
+def run_difficulty(configuration: str, difficulty: str, trace_memory: bool = False) -> dict:
+    """
+    Solve every puzzle of a difficulty with a solver configuration, checking the answers against the solution file.
+    Meant to run in a fresh process so the peak RSS belongs to this run only.
+
+    :param configuration: name of the configuration in CONFIGURATIONS
+    :param difficulty: name of the data/{difficulty}_puzzle.npy file to solve
+    :param trace_memory: whether to also record the peak memory allocated by python while solving a puzzle (slows the solver down)
+    :return: dictionary of the results, latencies are in seconds and memory in KiB
+    """
+
+    options = CONFIGURATIONS[configuration]
+    puzzles = np.load(f"data/{difficulty}_puzzle.npy")
+    solutions = np.load(f"data/{difficulty}_solution.npy")
+
+    latencies = []
+    wrong = []
+    stats = SearchStats()
+    peak_traced = None
+    for i in range(len(puzzles)):
+        if trace_memory:
+            tracemalloc.start()
+        start_time = time.perf_counter()
+        solution = sudoku_solver(puzzles[i].copy(), stats=stats, **options)
+        latencies.append(time.perf_counter() - start_time)
+        if trace_memory:
+            peak_traced = max(peak_traced or 0, tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+
+        if not np.array_equal(solution, solutions[i]):
+            wrong.append(i)
+
+    return {
+        "puzzles": len(puzzles),
+        "correct": len(puzzles) - len(wrong),
+        "wrong": wrong,
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "p99": float(np.percentile(latencies, 99)),
+        "max": max(latencies),
+        "puzzles_per_second": len(puzzles) / sum(latencies),
+        "nodes": stats.nodes,
+        "propagate_calls": stats.propagate_calls,
+        "max_frontier": stats.max_frontier,
+        "peak_rss_kib": peak_rss_kib(),
+        "peak_traced_kib": peak_traced,
+    }
+
+
+def run_suite(configurations: Iterable[str], difficulties: Iterable[str], trace_memory: bool = False) -> dict:
+    """
+    Run every configuration on every difficulty, each run in its own fresh process
+
+    :param configurations: names of the configurations in CONFIGURATIONS
+    :param difficulties: names of the data/{difficulty}_puzzle.npy files to solve
+    :param trace_memory: whether to also record the peak memory allocated by python while solving a puzzle
+    :return: dictionary of results indexed by configuration and then difficulty
+    """
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for configuration in configurations:
+        results[configuration] = {}
+        for difficulty in difficulties:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[configuration][difficulty] = executor.submit(run_difficulty, configuration, difficulty, trace_memory).result()
+    return results
+
+
+def print_results(results: dict):
+    """
+    :param results: dictionary of results returned by run_suite
+    """
+
+    print(f"{'configuration':<14} {'difficulty':<10} {'correct':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+          f"{'max (ms)':>9} {'puzzles/s':>10} {'nodes':>8} {'propagations':>13} {'frontier':>9} {'peak RSS (KiB)':>15}")
+    for configuration, difficulties in results.items():
+        for difficulty, result in difficulties.items():
+            peak_rss = "-" if result["peak_rss_kib"] is None else f"{result['peak_rss_kib']:.0f}"
+            print(f"{configuration:<14} {difficulty:<10} {result['correct']:>5}/{result['puzzles']:<2} "
+                  f"{result['p50'] * 1000:>9.2f} {result['p95'] * 1000:>9.2f} {result['p99'] * 1000:>9.2f} "
+                  f"{result['max'] * 1000:>9.2f} {result['puzzles_per_second']:>10.0f} {result['nodes']:>8} "
+                  f"{result['propagate_calls']:>13} {result['max_frontier']:>9} {peak_rss:>15}")
+            if result["peak_traced_kib"] is not None:
+                print(f"{'':<25} peak traced memory {result['peak_traced_kib']:.1f} KiB")
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Compare results against a stored baseline, only configurations and difficulties present in both are compared
+
+    :param results: dictionary of results returned by run_suite
+    :param baseline: dictionary of results loaded from an earlier run
+    :param threshold: relative change allowed before a metric counts as a regression, e.g. 0.1 for 10%
+    :return: a description of every regression found
+    """
+
+    regressions = []
+    for configuration, difficulties in results.items():
+        for difficulty, result in difficulties.items():
+            old_result = baseline.get(configuration, {}).get(difficulty)
+            if old_result is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                # Baselines stored before a metric was added can't be compared on it
+                if metric not in old_result:
+                    continue
+                old, new = old_result[metric], result[metric]
+                # Losing a correct answer is always a regression, the other metrics are allowed to move by the threshold
+                allowed = 0 if metric == "correct" else abs(old) * threshold
+                change = old - new if higher_is_better else new - old
+                if change > allowed:
+                    regressions.append(f"{configuration} {difficulty} {metric}: {old:.6g} -> {new:.6g}")
+    return regressions
+
+
+def count_nodes(puzzles: np.array, rules: Iterable[str]) -> dict:
+    """
+    Solve every puzzle with the trail search and the given propagation rules, counting the nodes of the search trees
+
+    :param puzzles: numpy array of N x 9 x 9 puzzles
+    :param rules: names of the propagation rules to use
+    :return: dictionary with the total number of nodes and how many assignments or eliminations each rule made
+    """
+
+    stats = SearchStats()
+    for i in range(len(puzzles)):
+        sudoku_solver(puzzles[i].copy(), strategy="trail", rules=rules, stats=stats)
+    return {"nodes": stats.nodes, "counts": {rule: stats.rule_counts.get(rule, 0) for rule in RULES}}
+
+
+def rule_report(puzzles: np.array):
+    """
+    Print how many search nodes each propagation rule saves, by comparing a search with all rules to a search with that rule turned off
+
+    :param puzzles: numpy array of N x 9 x 9 puzzles
+    """
+
+    all_rules = count_nodes(puzzles, RULES)
+    print(f"all rules: {all_rules['nodes']} nodes")
+    print(f"{'rule':<16} {'applied':>10} {'nodes without':>14} {'nodes saved':>12}")
+    for rule in RULES:
+        without_rule = count_nodes(puzzles, [other for other in RULES if other != rule])
+        print(f"{rule:<16} {all_rules['counts'][rule]:>10} {without_rule['nodes']:>14} {without_rule['nodes'] - all_rules['nodes']:>12}")
+
+
+def batch_report(difficulties: Iterable[str], repeat: int):
+    """
+    Print the throughput of solve_batch against solving the same puzzles one at a time with sudoku_solver
+
+    :param difficulties: names of the data/{difficulty}_puzzle.npy files to solve
+    :param repeat: how many times each file is stacked on itself, so the batch is big enough to measure
+    """
+
+    print(f"{'difficulty':<10} {'puzzles':>8} {'correct':>8} {'batch (puzzles/s)':>18} {'single (puzzles/s)':>19}")
+    for difficulty in difficulties:
+        puzzles = np.tile(np.load(f"data/{difficulty}_puzzle.npy"), (repeat, 1, 1))
+        solutions = np.tile(np.load(f"data/{difficulty}_solution.npy"), (repeat, 1, 1))
+
+        start_time = time.perf_counter()
+        batch_solutions = solve_batch(puzzles)
+        batch_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for i in range(len(puzzles)):
+            sudoku_solver(puzzles[i].copy(), strategy="trail")
+        single_time = time.perf_counter() - start_time
+
+        correct = int((batch_solutions == solutions).all(axis=(1, 2)).sum())
+        print(f"{difficulty:<10} {len(puzzles):>8} {correct:>8} {len(puzzles) / batch_time:>18.0f} {len(puzzles) / single_time:>19.0f}")
+
+
+def count_report(difficulties: Iterable[str], repeat: int):
+    """
+    Print the throughput of checking puzzles for a unique solution against solving them,
+    both one at a time (count_solutions and sudoku_solver) and as a stack (count_batch and solve_batch)
+
+    :param difficulties: names of the data/{difficulty}_puzzle.npy files to check
+    :param repeat: how many times each file is stacked on itself, so the batch is big enough to measure
+    """
+
+    print(f"{'difficulty':<10} {'puzzles':>8} {'unique':>7} {'none':>5} {'multiple':>9} "
+          f"{'count (puzzles/s)':>18} {'solve (puzzles/s)':>18} {'count_batch':>12} {'solve_batch':>12}")
+    for difficulty in difficulties:
+        puzzles = np.tile(np.load(f"data/{difficulty}_puzzle.npy"), (repeat, 1, 1))
+
+        start_time = time.perf_counter()
+        for i in range(len(puzzles)):
+            count_solutions(puzzles[i].copy(), limit=2)
+        count_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for i in range(len(puzzles)):
+            sudoku_solver(puzzles[i].copy(), strategy="trail", variable_ordering="mrv")
+        solve_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        counts = count_batch(puzzles, limit=2)
+        count_batch_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        solve_batch(puzzles, variable_ordering="mrv")
+        solve_batch_time = time.perf_counter() - start_time
+
+        print(f"{difficulty:<10} {len(puzzles):>8} {int((counts == 1).sum()):>7} {int((counts == 0).sum()):>5} {int((counts > 1).sum()):>9} "
+              f"{len(puzzles) / count_time:>18.0f} {len(puzzles) / solve_time:>18.0f} "
+              f"{len(puzzles) / count_batch_time:>12.0f} {len(puzzles) / solve_batch_time:>12.0f}")
+
+
+def cache_report(difficulties: Iterable[str], repeat: int, path: str = None):
+    """
+    Print the hit rate and throughput of a SolutionCache on a workload where every puzzle comes back as random equivalent
+    copies (relabelled, reordered or transposed), against solving every copy without the cache
+
+    :param difficulties: names of the data/{difficulty}_puzzle.npy files to make copies of
+    :param repeat: how many random copies of each puzzle the workload has
+    :param path: SQLite file for the cache to also store its solutions in, or None to only keep them in memory
+    """
+
+    generator = np.random.default_rng(0)
+    # Build the lookup tables of the canonical form before timing anything
+    canonicalize(np.zeros((9, 9), dtype=np.int8))
+    print(f"{'difficulty':<10} {'puzzles':>8} {'correct':>8} {'hit rate':>9} {'cached (puzzles/s)':>19} "
+          f"{'uncached (puzzles/s)':>21} {'time saved (s)':>15}")
+    for difficulty in difficulties:
+        originals = np.load(f"data/{difficulty}_puzzle.npy")
+        # Some solution files are stored as floats
+        original_solutions = np.load(f"data/{difficulty}_solution.npy").astype(originals.dtype)
+        transforms = [(i, random_transform(generator)) for i in range(len(originals)) for _ in range(repeat)]
+        generator.shuffle(transforms)
+        puzzles = [transform.apply(originals[i]) for i, transform in transforms]
+        # Puzzles without a solution have a solution of -1s, which stays the same in every copy
+        solutions = [transform.apply(original_solutions[i]) if original_solutions[i][0][0] != -1 else original_solutions[i]
+                     for i, transform in transforms]
+
+        cache = SolutionCache(path=path)
+        start_time = time.perf_counter()
+        cached = [sudoku_solver(puzzle.copy(), strategy="trail", cache=cache) for puzzle in puzzles]
+        cached_time = time.perf_counter() - start_time
+        cache.close()
+
+        start_time = time.perf_counter()
+        for puzzle in puzzles:
+            sudoku_solver(puzzle.copy(), strategy="trail")
+        uncached_time = time.perf_counter() - start_time
+
+        correct = sum(int((answer == solution).all()) for answer, solution in zip(cached, solutions))
+        print(f"{difficulty:<10} {len(puzzles):>8} {correct:>8} {cache.hit_rate():>9.1%} {len(puzzles) / cached_time:>19.0f} "
+              f"{len(puzzles) / uncached_time:>21.0f} {cache.time_saved:>15.3f}")
+
+
+def trace_report(configuration: str, difficulties: Iterable[str], directory: str, sample_every: int):
+    """
+    Solve every puzzle with full instrumentation, writing a search tree trace per puzzle and printing the search counters
+    and the time spent in each propagation phase
+
+    :param configuration: name of the configuration in CONFIGURATIONS
+    :param difficulties: names of the data/{difficulty}_puzzle.npy files to solve
+    :param directory: directory to write the {difficulty}_{index}.jsonl trace files to
+    :param sample_every: time the propagation phases of every n-th propagation call
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    phase_times = {}
+    print(f"{'puzzle':<14} {'nodes':>6} {'expanded':>9} {'backtracks':>11} {'contradictions':>15} {'max frontier':>13} {'eliminations':>13}")
+    for difficulty in difficulties:
+        puzzles = np.load(f"data/{difficulty}_puzzle.npy")
+        for i in range(len(puzzles)):
+            stats = SearchStats(trace=True, sample_every=sample_every)
+            sudoku_solver(puzzles[i].copy(), stats=stats, **CONFIGURATIONS[configuration])
+            stats.dump_trace(os.path.join(directory, f"{difficulty}_{i}.jsonl"))
+            for phase, seconds in stats.phase_times.items():
+                phase_times[phase] = phase_times.get(phase, 0.0) + seconds
+            print(f"{difficulty + ' ' + str(i):<14} {stats.nodes:>6} {stats.expanded:>9} {stats.backtracks:>11} "
+                  f"{stats.contradictions:>15} {stats.max_frontier:>13} {stats.eliminations:>13}")
+
+    print("Time spent in each propagation phase (sampled calls only):")
+    for phase, seconds in sorted(phase_times.items(), key=lambda item: -item[1]):
+        print(f"{phase:<16} {seconds * 1000:>10.3f} ms")
+
+
+def generate_puzzles(box_size: int, count: int, clue_fraction: float, seed: int = 0) -> np.array:
+    """
+    Make random puzzles of any box size by shuffling a filled pattern grid and then emptying cells at random.
+    The puzzles always have a solution but may have more than one.
+
+    :param box_size: width and height of a box, 3 for 9 x 9 puzzles, 4 for 16 x 16 and 5 for 25 x 25
+    :param count: number of puzzles to make
+    :param clue_fraction: fraction of the cells that keep their value
+    :param seed: seed of the random generator, so every run solves the same puzzles
+    :return: numpy array of count x n x n int8 puzzles, 0 for empty cells
+    """
+
+    rng = np.random.default_rng(seed)
+    size = box_size * box_size
+    r = np.arange(size)
+    # A valid filled grid: each row is the previous one shifted by a box, or by one cell at the start of a new band
+    pattern = (box_size * (r[:, None] % box_size) + r[:, None] // box_size + r[None, :]) % size
+
+    puzzles = []
+    for _ in range(count):
+        # Shuffling bands, rows within a band, stacks, columns within a stack and the values keeps the grid valid
+        rows = np.concatenate([band * box_size + rng.permutation(box_size) for band in rng.permutation(box_size)])
+        columns = np.concatenate([stack * box_size + rng.permutation(box_size) for stack in rng.permutation(box_size)])
+        grid = rng.permutation(size)[pattern[rows][:, columns]] + 1
+        grid[rng.random((size, size)) >= clue_fraction] = 0
+        puzzles.append(grid.astype(np.int8))
+    return np.array(puzzles)
+
+
+def is_valid_solution(puzzle: np.array, solution: np.array) -> bool:
+    """
+    Check a solution without a known answer, as generated puzzles can have more than one
+
+    :param puzzle: n x n puzzle, 0 for empty cells
+    :param solution: n x n solution given by a solver
+    :return: boolean saying whether the solution keeps the clues and has every value once in every row, column and box
+    """
+
+    geometry = board_geometry(box_size_of(puzzle))
+    cells = solution.ravel()
+    if not np.array_equal(cells[puzzle.ravel() != 0], puzzle.ravel()[puzzle.ravel() != 0]):
+        return False
+    values = set(range(1, geometry.size + 1))
+    return all(set(cells[unit].tolist()) == values for unit in geometry.units)
+
+
+def scaling_report(configurations: Iterable[str], count: int, clue_fraction: float):
+    """
+    Print how the solve time of generated puzzles grows from 9 x 9 to 16 x 16 and 25 x 25 boards
+
+    :param configurations: names of the configurations in CONFIGURATIONS
+    :param count: number of puzzles of each size
+    :param clue_fraction: fraction of the cells that are given as clues
+    """
+
+    print(f"{'configuration':<14} {'size':>6} {'puzzles':>8} {'correct':>8} {'mean (s)':>10} {'max (s)':>9} {'nodes':>7}")
+    for box_size in (3, 4, 5):
+        puzzles = generate_puzzles(box_size, count, clue_fraction, seed=box_size)
+        size = box_size * box_size
+        for configuration in configurations:
+            latencies = []
+            correct = 0
+            stats = SearchStats()
+            for puzzle in puzzles:
+                start_time = time.perf_counter()
+                solution = sudoku_solver(puzzle.copy(), stats=stats, **CONFIGURATIONS[configuration])
+                latencies.append(time.perf_counter() - start_time)
+                correct += is_valid_solution(puzzle, solution)
+            print(f"{configuration:<14} {f'{size}x{size}':>6} {len(puzzles):>8} {correct:>8} "
+                  f"{np.mean(latencies):>10.4f} {np.max(latencies):>9.4f} {stats.nodes:>7}")
+
+
+def parallel_report(name: str, puzzles: np.array, worker_counts: Iterable[int], subtrees_per_worker: int, split_nodes: int = None):
+    """
+    Print the speedup of splitting each puzzle's search tree over a ParallelSolver pool against solving it on one core.
+    Each pool is started before the timing, as a long running service would keep it.
+
+    :param name: name of the puzzles to print
+    :param puzzles: numpy array of the puzzles, each one is solved on its own
+    :param worker_counts: numbers of worker processes to try
+    :param subtrees_per_worker: how many subtrees each puzzle is split into per worker
+    :param split_nodes: largest number of values tried while splitting a puzzle, or None for ParallelSolver's default
+    """
+
+    start_time = time.perf_counter()
+    expected = [sudoku_solver(puzzle.copy(), strategy="dfs") for puzzle in puzzles]
+    sequential_time = time.perf_counter() - start_time
+    print(f"{name}: {len(puzzles)} puzzles, {sequential_time:.3f} seconds on one core without splitting ({os.cpu_count()} CPUs)")
+
+    print(f"{'workers':>7} {'correct':>8} {'total (s)':>10} {'max (s)':>9} {'speedup':>8} {'nodes':>8} {'pooled':>7}")
+    for workers in worker_counts:
+        with ParallelSolver(workers, subtrees_per_worker, split_nodes=split_nodes) as parallel_solver:
+            latencies = []
+            correct = 0
+            stats = SearchStats()
+            for puzzle, answer in zip(puzzles, expected):
+                puzzle_start_time = time.perf_counter()
+                solution = parallel_solver.solve(puzzle.copy(), stats)
+                latencies.append(time.perf_counter() - puzzle_start_time)
+                # Puzzles with several solutions may get a different one than the single core search
+                correct += (solution == -1).all() if (answer == -1).all() else is_valid_solution(puzzle, solution)
+        total_time = sum(latencies)
+        print(f"{workers:>7} {correct:>8} {total_time:>10.3f} {max(latencies):>9.4f} {sequential_time / total_time:>8.2f} {stats.nodes:>8} {parallel_solver.pooled:>7}")
+
+
+def text_report(lines: int, solve_lines: int, chunk_size: int):
+    """
+    Print the throughput of streaming text puzzle files, plain and gzip compressed: writing, reading, converting to .npy
+    and solving. The puzzles are every difficulty's puzzles repeated until there are enough lines.
+
+    :param lines: number of lines of the files that are written, read and converted
+    :param solve_lines: number of lines of the file that is solved, solving is much slower than reading
+    :param chunk_size: number of puzzles handled at a time
+    """
+
+    puzzles = np.concatenate([np.load(f"data/{difficulty}_puzzle.npy") for difficulty in DIFFICULTIES])
+
+    def repeated(count: int):
+        for start in range(0, count, chunk_size):
+            indices = np.arange(start, min(start + chunk_size, count)) % len(puzzles)
+            yield puzzles[indices]
+
+    def report(step: str, path: str, count: int, function):
+        start_time = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start_time
+        megabytes = os.path.getsize(path) / 2 ** 20
+        print(f"{step:<12} {os.path.basename(path):<24} {count:>9} {seconds:>9.2f} {count / seconds:>14.0f} {megabytes:>10.1f}")
+
+    print(f"{'step':<12} {'file':<24} {'lines':>9} {'time (s)':>9} {'lines/s':>14} {'size (MB)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("puzzles.txt", "puzzles.txt.gz"):
+            path = os.path.join(directory, name)
+            npy_path = os.path.join(directory, "puzzles.npy")
+            report("write", path, lines, lambda: write_puzzles(path, repeated(lines)))
+            report("read", path, lines, lambda: sum(len(chunk) for chunk in read_puzzles(path, chunk_size)))
+            report("to-npy", npy_path, lines, lambda: text_to_npy(path, npy_path, chunk_size))
+            report("from-npy", path, lines, lambda: npy_to_text(npy_path, path, chunk_size))
+
+            solve_path = os.path.join(directory, "solve_" + name)
+            write_puzzles(solve_path, repeated(solve_lines))
+            solution_path = os.path.join(directory, "solutions_" + name)
+            report("solve", solution_path, solve_lines, lambda: solve_text_file(solve_path, solution_path, chunk_size))
+
+    peak_rss = peak_rss_kib()
+    if peak_rss is not None:
+        print(f"peak RSS {peak_rss / 1024:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sudoku solver configurations on the provided puzzle files")
+    parser.add_argument("--configurations", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    parser.add_argument("--difficulties", nargs="+", default=DIFFICULTIES, choices=DIFFICULTIES)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change allowed before a metric is flagged as a regression")
+    parser.add_argument("--memory", action="store_true", help="also trace the peak memory python allocates per puzzle (slow)")
+    parser.add_argument("--rules", action="store_true", help="report the search nodes saved by each propagation rule on the hard puzzles instead")
+    parser.add_argument("--batch", action="store_true", help="report the throughput of solve_batch on every difficulty instead")
+    parser.add_argument("--count", action="store_true", help="report the throughput of checking every difficulty for unique solutions instead")
+    parser.add_argument("--cache", action="store_true", help="report the hit rate and throughput of the solution cache on random equivalent copies of every difficulty instead")
+    parser.add_argument("--cache-file", help="SQLite file for the --cache report to also store its solutions in")
+    parser.add_argument("--repeat", type=int, default=100, help="how many copies of each puzzle file to solve with --batch, --count or --cache")
+    parser.add_argument("--trace", metavar="DIRECTORY", help="write a search tree trace of every puzzle, solved with the first configuration, to this directory instead")
+    parser.add_argument("--sample-every", type=int, default=1, help="time the propagation phases of every n-th propagation call with --trace")
+    parser.add_argument("--scaling", action="store_true", help="report how the solve time grows on generated 9x9, 16x16 and 25x25 puzzles instead")
+    parser.add_argument("--puzzles", type=int, default=10, help="how many puzzles of each size to generate with --scaling")
+    # With half the cells or fewer, some random 25x25 puzzles take minutes to search
+    parser.add_argument("--clues", type=float, default=0.55, help="fraction of the cells given as clues in the --scaling puzzles")
+    parser.add_argument("--parallel", action="store_true", help="report the speedup of splitting the search of each puzzle over several cores instead")
+    parser.add_argument("--workers", type=int, nargs="+", help="worker counts to try with --parallel (default: powers of two up to the number of CPUs)")
+    parser.add_argument("--subtrees-per-worker", type=int, default=8, help="how many subtrees each puzzle is split into per worker with --parallel")
+    parser.add_argument("--split-nodes", type=int, help="with --parallel, largest number of values tried while splitting a puzzle (default: one per worker)")
+    parser.add_argument("--box-size", type=int, help="with --parallel, generate --puzzles puzzles of this box size with --clues instead of loading the difficulties")
+    parser.add_argument("--text", action="store_true", help="report the throughput of streaming puzzles through text files instead")
+    parser.add_argument("--lines", type=int, default=2000000, help="number of lines written, read and converted with --text")
+    parser.add_argument("--solve-lines", type=int, default=100000, help="number of lines solved with --text")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="number of puzzles handled at a time with --text")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace_report(args.configurations[0], args.difficulties, args.trace, args.sample_every)
+        return
+
+    if args.scaling:
+        scaling_report(args.configurations, args.puzzles, args.clues)
+        return
+    if args.rules:
+        rule_report(np.load("data/hard_puzzle.npy"))
+        return
+    if args.batch:
+        batch_report(args.difficulties, args.repeat)
+        return
+    if args.count:
+        count_report(args.difficulties, args.repeat)
+        return
+    if args.text:
+        text_report(args.lines, args.solve_lines, args.chunk_size)
+        return
+    if args.parallel:
+        worker_counts = args.workers or sorted({2 ** i for i in range(os.cpu_count().bit_length()) if 2 ** i <= os.cpu_count()} | {os.cpu_count()})
+        if args.box_size:
+            size = args.box_size * args.box_size
+            puzzles = generate_puzzles(args.box_size, args.puzzles, args.clues, seed=args.box_size)
+            parallel_report(f"generated {size}x{size}", puzzles, worker_counts, args.subtrees_per_worker, args.split_nodes)
+        else:
+            for difficulty in args.difficulties:
+                parallel_report(difficulty, np.load(f"data/{difficulty}_puzzle.npy"), worker_counts, args.subtrees_per_worker, args.split_nodes)
+        return
+    if args.cache:
+        cache_report(args.difficulties, args.repeat, args.cache_file)
+        return
+
+    results = run_suite(args.configurations, args.difficulties, args.memory)
+    print_results(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import os
+import signal
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from solver import sudoku_solver
+
+
+class PuzzleTimeout(Exception):
+    """
+    Raised inside a worker when a single puzzle takes longer than the per-puzzle timeout
+    """
+
+
+def _raise_timeout(signum, frame):
+    raise PuzzleTimeout()
+
+
+def _solve_with_timeout(puzzle: np.array, timeout: float, strategy: str, options: dict) -> np.array:
+    """
+    Solve a single puzzle, giving up after timeout seconds.
+    The timeout uses a SIGALRM timer, so on platforms without it (Windows) puzzles are never timed out.
+
+    :param puzzle: 9x9 numpy array, 0 for empty cells
+    :param timeout: seconds a puzzle may take or None for no limit
+    :param strategy: name of the strategy in solver.STRATEGIES
+    :param options: extra keyword arguments for sudoku_solver
+    :return: the solution of the puzzle
+    """
+
+    if timeout is None or not hasattr(signal, "SIGALRM"):
+        return sudoku_solver(puzzle, strategy=strategy, **options)
+
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return sudoku_solver(puzzle, strategy=strategy, **options)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _solve_chunk(input_path: str, output_path: str, start: int, stop: int, timeout: float, strategy: str, options: dict) -> dict:
+    """
+    Solve the puzzles in [start, stop) of the input file and write the solutions into the same rows of the output file.
+    Runs in a worker process, both files are memory-mapped so only the chunk itself is read and written.
+
+    :param input_path: path of the .npy file of N x 9 x 9 puzzles
+    :param output_path: path of the preallocated .npy file for the solutions
+    :param start: index of the first puzzle of the chunk
+    :param stop: index after the last puzzle of the chunk
+    :param timeout: seconds a puzzle may take or None for no limit
+    :param strategy: name of the strategy in solver.STRATEGIES
+    :param options: extra keyword arguments for sudoku_solver
+    :return: dictionary with the worker's process id, the time spent solving and how many puzzles were unsolvable or timed out
+    """
+
+    start_time = time.perf_counter()
+    puzzles = np.load(input_path, mmap_mode="r")
+    solutions = np.load(output_path, mmap_mode="r+")
+
+    unsolvable = 0
+    timed_out = 0
+    for i in range(start, stop):
+        try:
+            solution = _solve_with_timeout(np.array(puzzles[i]), timeout, strategy, options)
+        except PuzzleTimeout:
+            solution = np.full(puzzles.shape[1:], -1)
+            timed_out += 1
+        else:
+            if (solution == -1).all():
+                unsolvable += 1
+        solutions[i] = solution
+
+    solutions.flush()
+    return {"pid": os.getpid(), "puzzles": stop - start, "unsolvable": unsolvable, "timed_out": timed_out,
+            "busy_time": time.perf_counter() - start_time}
+
+
+def solve_file(input_path: str, output_path: str, workers: int = None, chunk_size: int = 1000, timeout: float = None, strategy: str = "trail", **options) -> dict:
+    """
+    Solve every puzzle of a .npy file with a process pool and write the solutions to another .npy file.
+    The output has the same shape and dtype as the input (like data/*_solution.npy), with -1 for puzzles that have no solution or timed out.
+
+    :param input_path: path of the .npy file of N x 9 x 9 puzzles
+    :param output_path: path of the .npy file to write the solutions to (overwritten)
+    :param workers: number of worker processes, the number of CPUs by default
+    :param chunk_size: number of consecutive puzzles handed to a worker at a time
+    :param timeout: seconds a single puzzle may take or None for no limit
+    :param strategy: name of the strategy in solver.STRATEGIES
+    :param options: extra keyword arguments for sudoku_solver
+    :return: summary dictionary with totals, throughput and the utilisation of every worker
+    """
+
+    puzzles = np.load(input_path, mmap_mode="r")
+    # Preallocate the output so every worker can write its own rows of it
+    solutions = np.lib.format.open_memmap(output_path, mode="w+", dtype=puzzles.dtype, shape=puzzles.shape)
+    del solutions
+
+    start_time = time.perf_counter()
+    chunks = [(start, min(start + chunk_size, len(puzzles))) for start in range(0, len(puzzles), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_solve_chunk, input_path, output_path, start, stop, timeout, strategy, options)
+                   for start, stop in chunks]
+        results = [future.result() for future in futures]
+    wall_time = time.perf_counter() - start_time
+
+    # Group the chunk results by the worker process that solved them
+    per_worker = {}
+    for result in results:
+        worker = per_worker.setdefault(result["pid"], {"chunks": 0, "puzzles": 0, "busy_time": 0.0})
+        worker["chunks"] += 1
+        worker["puzzles"] += result["puzzles"]
+        worker["busy_time"] += result["busy_time"]
+    for worker in per_worker.values():
+        worker["utilisation"] = worker["busy_time"] / wall_time if wall_time > 0 else 0.0
+
+    return {
+        "puzzles": len(puzzles),
+        "unsolvable": sum(result["unsolvable"] for result in results),
+        "timed_out": sum(result["timed_out"] for result in results),
+        "wall_time": wall_time,
+        "puzzles_per_second": len(puzzles) / wall_time if wall_time > 0 else 0.0,
+        "workers": per_worker,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve every puzzle of a .npy file in parallel and write the solutions to another .npy file")
+    parser.add_argument("input", help="path of the .npy file of N x 9 x 9 puzzles")
+    parser.add_argument("output", help="path of the .npy file to write the solutions to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="number of puzzles handed to a worker at a time")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds a single puzzle may take before it is given -1")
+    parser.add_argument("--strategy", default="trail", help="search strategy of sudoku_solver")
+    args = parser.parse_args()
+
+    summary = solve_file(args.input, args.output, args.workers, args.chunk_size, args.timeout, args.strategy)
+    print(f"Solved {summary['puzzles']} puzzles in {summary['wall_time']:.3f} seconds ({summary['puzzles_per_second']:.0f} puzzles/s)")
+    print(f"{summary['unsolvable']} unsolvable, {summary['timed_out']} timed out")
+    for pid, worker in summary["workers"].items():
+        print(f"worker {pid}: {worker['chunks']} chunks, {worker['puzzles']} puzzles, "
+              f"{worker['busy_time']:.3f} seconds busy, {worker['utilisation']:.0%} utilisation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import time
+from collections import deque
+from itertools import combinations
+from typing import Callable, Iterable, List, Tuple
+from board_functions import board_geometry
+
+# Every propagation rule the engine knows, all of them are used unless a subset is selected
+RULES = ("naked_singles", "hidden_singles", "naked_subsets", "hidden_subsets", "pointing")
+
+
+class ConstraintPropagation:
+    """
+    Queue driven constraint propagation that keeps going until none of the enabled rules can make any more progress:
+    * naked_singles - a cell with a single option left is assigned that option
+    * hidden_singles - a value that only fits in one cell of a row, column or box is assigned to that cell
+    * naked_subsets - k cells of a unit (pairs or triples) with only k options between them remove those options from the rest of the unit
+    * hidden_subsets - k values that only fit in the same k cells of a unit remove every other option from those cells
+    * pointing - a value that is confined to one row or column of a box is removed from the rest of that row or column,
+      and a value confined to one box within a row or column is removed from the rest of the box (box-line reduction)
+
+    Assigning a value always removes it from the cell's peers. Whenever a cell changes, the units it belongs to are queued
+    to be checked again, so assignments made late on trigger the rules again until the fixpoint is reached.
+    The boards are flat python lists (index row * size + column) and are changed in place, and an engine only works on
+    boards of the box size it was created for.
+
+    Propagation stops as soon as it finds a contradiction, i.e. an unassigned cell without any options, a value that has
+    no place left in a unit or two values that can only go in the same cell. The board can't be solved from there,
+    so None is returned and the caller can drop the state straight away.
+    """
+
+    def __init__(self, rules: Iterable[str] = RULES, max_subset_size: int = 3, sample_every: int = 0, box_size: int = 3):
+        """
+        :param rules: names of the rules in RULES to use
+        :param max_subset_size: largest naked or hidden subset to look for (2 for pairs, 3 for pairs and triples)
+        :param sample_every: if n > 0, every n-th call records the seconds spent in each phase of propagation in timings
+        :param box_size: width and height of a box of the boards to propagate, 3 for 9 x 9 boards
+        """
+        unknown_rules = set(rules) - set(RULES)
+        if unknown_rules:
+            raise ValueError(f"Unknown propagation rules {sorted(unknown_rules)}, expected some of {list(RULES)}")
+
+        self.rules = frozenset(rules)
+        # The index tables of the board size, shared by every engine of that size
+        self.geometry = board_geometry(box_size)
+        self.size = self.geometry.size
+        self.all_candidates = self.geometry.all_candidates
+        self.peers = self.geometry.peers
+        self.units = self.geometry.units
+        self.cell_units = self.geometry.cell_units
+        self.popcount = self.geometry.popcount
+        self.max_subset_size = max_subset_size
+        # How many assignments or eliminations each rule has made, summed over every call
+        self.counts = dict.fromkeys(RULES, 0)
+        # Number of calls and of options removed from cells, summed over every call
+        self.calls = 0
+        self.eliminations = 0
+        self.sample_every = sample_every
+        # Seconds spent assigning cells, scanning units and in each unit rule, during the sampled calls
+        self.timings = {}
+
+        # The enabled unit rules, in the order they are applied to a unit
+        self.unit_rules = [(rule, apply_rule) for rule, apply_rule in
+                           (("hidden_singles", self._hidden_singles), ("pointing", self._pointing),
+                            ("naked_subsets", self._naked_subsets), ("hidden_subsets", self._hidden_subsets))
+                           if rule in self.rules]
+
+    def propagate(self, board: list, possible_actions_board: list, assignments: Iterable[Tuple[int, int]], set_cell: Callable[[int, int, int], None] = None) -> Tuple[list, list]:
+        """
+        Assign the given values and propagate their effect until the fixpoint is reached
+
+        :param board: flat list of the board values
+        :param possible_actions_board: flat list of the candidate bitmasks
+        :param assignments: (cell index, value) pairs to assign
+        :param set_cell: function called as set_cell(index, value, mask) to change a cell, e.g. so a search can record the change on its trail (by default the lists are written directly)
+        :return: a tuple containing the propagated board and possible_actions_board, or None if a contradiction was found
+        """
+
+        self._start(board, possible_actions_board, set_cell)
+        self.to_assign.extend(assignments)
+        return self._run()
+
+    def propagate_board(self, board: list, possible_actions_board: list, set_cell: Callable[[int, int, int], None] = None) -> Tuple[list, list]:
+        """
+        Propagate the effect of every value already on the board and check every unit, used on the initial board
+
+        :param board: flat list of the board values
+        :param possible_actions_board: flat list of the candidate bitmasks
+        :param set_cell: function called as set_cell(index, value, mask) to change a cell (by default the lists are written directly)
+        :return: a tuple containing the propagated board and possible_actions_board, or None if a contradiction was found
+        """
+
+        self._start(board, possible_actions_board, set_cell)
+        for index, n in enumerate(board):
+            if n != 0:
+                self._eliminate_from_peers(index, n)
+        for unit in range(len(self.units)):
+            self._queue_unit(unit)
+        return self._run()
+
+    def _start(self, board: list, possible_actions_board: list, set_cell: Callable[[int, int, int], None]):
+        """
+        Set up the boards and empty queues for a new call
+
+        :param board: flat list of the board values
+        :param possible_actions_board: flat list of the candidate bitmasks
+        :param set_cell: function used to change a cell or None to write the lists directly
+        """
+
+        self.board = board
+        self.possible_actions_board = possible_actions_board
+        self.set_cell = set_cell or self._write_cell
+        # Cells waiting to be assigned as (cell index, value)
+        self.to_assign = []
+        # Units waiting to be checked by the unit rules, with a flag per unit so a unit is never queued twice
+        self.units_to_check = deque()
+        self.is_queued = [False] * len(self.units)
+        self.contradiction = False
+        self.calls += 1
+        self.sampled = self.sample_every > 0 and self.calls % self.sample_every == 0
+
+    def _write_cell(self, index: int, value: int, mask: int):
+        self.board[index] = value
+        self.possible_actions_board[index] = mask
+
+    def _run(self) -> Tuple[list, list]:
+        """
+        Keep assigning queued cells and checking queued units until both queues are empty (the fixpoint)
+
+        :return: a tuple containing the propagated board and possible_actions_board, or None if a contradiction was found
+        """
+
+        # The timed version of the loop is kept separate so calls that aren't sampled pay nothing for it
+        if self.sampled:
+            return self._run_timed()
+
+        while not self.contradiction:
+            # Assignments are cheap and make the most progress, so they always go first
+            if self.to_assign:
+                self._assign(*self.to_assign.pop())
+            elif self.units_to_check:
+                unit = self.units_to_check.popleft()
+                self.is_queued[unit] = False
+                unassigned = self._scan_unit(unit)
+                for rule, apply_rule in self.unit_rules:
+                    if not unassigned or self.contradiction:
+                        break
+                    apply_rule(unit, unassigned)
+            else:
+                return self.board, self.possible_actions_board
+        return None
+
+    def _run_timed(self) -> Tuple[list, list]:
+        """
+        The same loop as _run, but adding the time spent in each phase to timings
+
+        :return: a tuple containing the propagated board and possible_actions_board, or None if a contradiction was found
+        """
+
+        timings = self.timings
+        while not self.contradiction:
+            start_time = time.perf_counter()
+            if self.to_assign:
+                self._assign(*self.to_assign.pop())
+                timings["assign"] = timings.get("assign", 0.0) + time.perf_counter() - start_time
+            elif self.units_to_check:
+                unit = self.units_to_check.popleft()
+                self.is_queued[unit] = False
+                unassigned = self._scan_unit(unit)
+                timings["scan_unit"] = timings.get("scan_unit", 0.0) + time.perf_counter() - start_time
+                for rule, apply_rule in self.unit_rules:
+                    if not unassigned or self.contradiction:
+                        break
+                    start_time = time.perf_counter()
+                    apply_rule(unit, unassigned)
+                    timings[rule] = timings.get(rule, 0.0) + time.perf_counter() - start_time
+            else:
+                return self.board, self.possible_actions_board
+        return None
+
+    def _queue_unit(self, unit: int):
+        if not self.is_queued[unit]:
+            self.is_queued[unit] = True
+            self.units_to_check.append(unit)
+
+    def _assign(self, index: int, n: int):
+        """
+        Assign n to a cell and remove n from all of its peers
+
+        :param index: flat cell index
+        :param n: value to put in the cell
+        """
+
+        # The cell may have been assigned the same value already (e.g. as both a naked and a hidden single)
+        if self.board[index] == n:
+            return
+        # If the cell was given a different value or lost this one, the value has no place left
+        if self.board[index] != 0 or not self.possible_actions_board[index] >> (n - 1) & 1:
+            self.contradiction = True
+            return
+        self.set_cell(index, n, 0)
+        for unit in self.cell_units[index]:
+            self._queue_unit(unit)
+        self._eliminate_from_peers(index, n)
+
+    def _eliminate_from_peers(self, index: int, n: int):
+        bit = 1 << (n - 1)
+        possible_actions_board = self.possible_actions_board
+        for peer in self.peers[index]:
+            if possible_actions_board[peer] & bit:
+                self._eliminate(peer, bit)
+                if self.contradiction:
+                    return
+
+    def _eliminate(self, index: int, bits: int):
+        """
+        Remove options from a cell, queue its units to be checked again and queue it for assignment if it is left with a single option
+
+        :param index: flat cell index
+        :param bits: bitmask of the options to remove, every one of them must currently be an option of the cell
+        """
+
+        mask = self.possible_actions_board[index] ^ bits
+        self.set_cell(index, 0, mask)
+        self.eliminations += 1
+        # The cell can't take any value anymore
+        if mask == 0:
+            self.contradiction = True
+            return
+        for unit in self.cell_units[index]:
+            self._queue_unit(unit)
+        if "naked_singles" in self.rules and mask and mask & (mask - 1) == 0:
+            self.counts["naked_singles"] += 1
+            self.to_assign.append((index, mask.bit_length()))
+
+    def _scan_unit(self, unit: int) -> List[int]:
+        """
+        Find the unassigned cells of a unit, checking that every value can still be placed in the unit
+
+        :param unit: unit id, index into the geometry's units
+        :return: list of the unit's unassigned cell indexes, empty if there are none or a contradiction was found
+        """
+
+        board = self.board
+        possible_actions_board = self.possible_actions_board
+        unassigned = []
+        # Every value has to be either assigned in the unit or still be an option for one of its unassigned cells
+        values = 0
+        for index in self.units[unit]:
+            if board[index] == 0:
+                unassigned.append(index)
+                values |= possible_actions_board[index]
+            else:
+                values |= 1 << (board[index] - 1)
+        if values != self.all_candidates:
+            self.contradiction = True
+            return []
+        return unassigned
+
+    def _hidden_singles(self, unit: int, unassigned: List[int]):
+        possible_actions_board = self.possible_actions_board
+        # Build the bitmask of values that appear in exactly one cell of the unit
+        seen_once = 0
+        seen_more = 0
+        for index in unassigned:
+            mask = possible_actions_board[index]
+            seen_more |= seen_once & mask
+            seen_once |= mask
+        singles = seen_once & ~seen_more
+        if not singles:
+            return
+
+        for index in unassigned:
+            single = possible_actions_board[index] & singles
+            if not single:
+                continue
+            # The cell is the only place for more than one value, but it can only take one of them
+            if single & (single - 1):
+                self.contradiction = True
+                return
+            self.counts["hidden_singles"] += 1
+            self.to_assign.append((index, single.bit_length()))
+
+    def _pointing(self, unit: int, unassigned: List[int]):
+        possible_actions_board = self.possible_actions_board
+        # Boxes look at the rows and columns they cross, rows and columns look at the boxes they cross
+        crossing = (0, 1) if unit >= 2 * self.size else (2,)
+        values = 0
+        for index in unassigned:
+            values |= possible_actions_board[index]
+
+        cell_units = self.cell_units
+        for n in range(1, self.size + 1):
+            bit = 1 << (n - 1)
+            if not values & bit:
+                continue
+            cells = [index for index in unassigned if possible_actions_board[index] & bit]
+            for kind in crossing:
+                other_unit = cell_units[cells[0]][kind]
+                if all(cell_units[index][kind] == other_unit for index in cells):
+                    # The value has to go in the overlap, so remove it from the rest of the crossing unit
+                    for index in self.units[other_unit]:
+                        if index not in cells and possible_actions_board[index] & bit:
+                            self.counts["pointing"] += 1
+                            self._eliminate(index, bit)
+                            if self.contradiction:
+                                return
+
+    def _naked_subsets(self, unit: int, unassigned: List[int]):
+        possible_actions_board = self.possible_actions_board
+        popcount = self.popcount
+        for size in range(2, self.max_subset_size + 1):
+            if len(unassigned) <= size:
+                return
+            small_cells = [index for index in unassigned if 2 <= popcount[possible_actions_board[index]] <= size]
+            for subset in combinations(small_cells, size):
+                values = 0
+                for index in subset:
+                    values |= possible_actions_board[index]
+                # There are fewer values between the cells than there are cells to fill
+                if popcount[values] < size:
+                    self.contradiction = True
+                    return
+                if popcount[values] != size:
+                    continue
+                # The subset's cells take all of these values between them, so no other cell in the unit can
+                for index in unassigned:
+                    if index not in subset and possible_actions_board[index] & values:
+                        self.counts["naked_subsets"] += 1
+                        self._eliminate(index, possible_actions_board[index] & values)
+                        if self.contradiction:
+                            return
+
+    def _hidden_subsets(self, unit: int, unassigned: List[int]):
+        possible_actions_board = self.possible_actions_board
+        popcount = self.popcount
+        for size in range(2, self.max_subset_size + 1):
+            if len(unassigned) <= size:
+                return
+            # For every value, the bitmask of positions (within the unassigned list, so at most size bits) where it can still go
+            places = {}
+            for n in range(1, self.size + 1):
+                bit = 1 << (n - 1)
+                positions = 0
+                for position, index in enumerate(unassigned):
+                    if possible_actions_board[index] & bit:
+                        positions |= 1 << position
+                if 2 <= popcount[positions] <= size:
+                    places[bit] = positions
+
+            for subset in combinations(places, size):
+                positions = 0
+                for bit in subset:
+                    positions |= places[bit]
+                # There are fewer cells left for the values than there are values to place
+                if popcount[positions] < size:
+                    self.contradiction = True
+                    return
+                if popcount[positions] != size:
+                    continue
+                # These values can only go in these cells, so the cells can't take any other value
+                values = sum(subset)
+                for position, index in enumerate(unassigned):
+                    extra = possible_actions_board[index] & ~values
+                    if positions >> position & 1 and extra:
+                        self.counts["hidden_subsets"] += 1
+                        self._eliminate(index, extra)
+                        if self.contradiction:
+                            return
@@ -0,0 +1,248 @@
+import numpy as np
+from typing import List
+from board_functions import box_size_of
+from search_stats import SearchStats
+
+# Exact cover column groups: every cell has a value, and every row, column and box has each value once.
+# Each group has one column per cell (or per unit and value), so a 9 x 9 board has 4 x 81 = 324 columns
+CELL_COLUMNS = 0
+ROW_COLUMNS = 1
+COLUMN_COLUMNS = 2
+BOX_COLUMNS = 3
+
+
+class DancingLinks:
+    """
+    Knuth's Algorithm X with dancing links, solving sudoku as an exact cover problem.
+    Each matrix row is a choice (row, column, value) and covers the 4 constraint columns it satisfies.
+    The links are kept in flat python lists indexed by node, node 0 is the root and nodes 1 to 4 x cells are the column headers.
+    """
+
+    def __init__(self, board: np.array):
+        """
+        Build the exact cover matrix from the clue grid, only adding the clue's choice for assigned cells
+
+        :param board: numpy array of a n x n int board or grid in range [1..n], 0 for empty cells
+        """
+        self.box_size = box_size_of(board)
+        self.size = len(board)
+        self.number_of_columns = 4 * self.size * self.size
+        self.left = []
+        self.right = []
+        self.up = []
+        self.down = []
+        self.column = []
+        # The (row, column, value) choice each data node belongs to
+        self.choice = []
+        self.column_size = [0] * (self.number_of_columns + 1)
+        # Data nodes of the choices picked so far
+        self.solution = []
+        # Number of choices tried by the search, i.e. nodes of the search tree
+        self.nodes = 0
+
+        # Root and column headers form a circular list, every header starts as an empty vertical circle
+        for node in range(self.number_of_columns + 1):
+            self._new_node(node, None)
+            self.left[node] = node - 1
+            self.right[node] = node + 1
+        self.left[0] = self.number_of_columns
+        self.right[self.number_of_columns] = 0
+
+        for row in range(self.size):
+            for column in range(self.size):
+                value = int(board[row][column])
+                values = [value] if value != 0 else range(1, self.size + 1)
+                for n in values:
+                    self._add_choice(row, column, n)
+
+    def _new_node(self, column: int, choice: tuple) -> int:
+        node = len(self.left)
+        self.left.append(node)
+        self.right.append(node)
+        self.up.append(node)
+        self.down.append(node)
+        self.column.append(column)
+        self.choice.append(choice)
+        return node
+
+    def _add_choice(self, row: int, column: int, n: int):
+        """
+        Add the matrix row for putting n at (row, column), linked into the bottom of each of its 4 columns
+
+        :param row: board row
+        :param column: board column
+        :param n: value in range [1..size]
+        """
+
+        size = self.size
+        cells = size * size
+        box = row // self.box_size * self.box_size + column // self.box_size
+        columns = (CELL_COLUMNS * cells + row * size + column, ROW_COLUMNS * cells + row * size + n - 1,
+                   COLUMN_COLUMNS * cells + column * size + n - 1, BOX_COLUMNS * cells + box * size + n - 1)
+        first = None
+        for header in columns:
+            # Headers are nodes 1 to 4 x cells, one after the node of the previous header
+            header += 1
+            node = self._new_node(header, (row, column, n))
+            # Insert at the bottom of the column
+            self.up[node] = self.up[header]
+            self.down[node] = header
+            self.down[self.up[header]] = node
+            self.up[header] = node
+            self.column_size[header] += 1
+            # Insert at the end of the row's circular list
+            if first is None:
+                first = node
+            else:
+                self.left[node] = self.left[first]
+                self.right[node] = first
+                self.right[self.left[first]] = node
+                self.left[first] = node
+
+    def _cover(self, header: int):
+        """
+        Remove a column from the header list and every row that has a node in that column from the other columns
+
+        :param header: node of the column header
+        """
+
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.column_size
+        right[left[header]] = right[header]
+        left[right[header]] = left[header]
+        i = down[header]
+        while i != header:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def _uncover(self, header: int):
+        """
+        Undo _cover, restoring the links in exactly the opposite order
+
+        :param header: node of the column header
+        """
+
+        left, right, up, down, column, size = self.left, self.right, self.up, self.down, self.column, self.column_size
+        i = up[header]
+        while i != header:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[header]] = header
+        left[right[header]] = header
+
+    def _select(self, node: int):
+        """
+        Pick the choice of a node, covering the other columns of its row (the node's own column is already covered)
+
+        :param node: data node of the choice
+        """
+
+        self.nodes += 1
+        self.solution.append(node)
+        j = self.right[node]
+        while j != node:
+            self._cover(self.column[j])
+            j = self.right[j]
+
+    def _deselect(self, node: int):
+        """
+        Undo _select
+
+        :param node: data node of the choice
+        """
+
+        self.solution.pop()
+        j = self.left[node]
+        while j != node:
+            self._uncover(self.column[j])
+            j = self.left[j]
+
+    def _smallest_column(self) -> int:
+        """
+        :return: header node of the uncovered column with the fewest rows (the min-column heuristic)
+        """
+
+        right, size = self.right, self.column_size
+        best = right[0]
+        header = right[best]
+        while header != 0:
+            if size[header] < size[best]:
+                best = header
+            header = right[header]
+        return best
+
+    def search(self) -> bool:
+        """
+        Search for an exact cover depth-first, always branching on the column with the fewest rows.
+        Each stack entry is a covered column and the data node of the choice currently tried for it.
+
+        :return: boolean saying whether a solution was found (the choices are then in self.solution)
+        """
+
+        stack = []
+        # Move down to choose a column and try its first row
+        descend = True
+        while True:
+            if descend:
+                if self.right[0] == 0:
+                    return True
+                header = self._smallest_column()
+                self._cover(header)
+                node = self.down[header]
+                stack.append([header, node])
+            else:
+                # Move on to the next row of the column on top of the stack
+                header, node = stack[-1]
+                self._deselect(node)
+                node = self.down[node]
+                stack[-1][1] = node
+
+            if node != header:
+                self._select(node)
+                descend = True
+                continue
+
+            # Every row of the column failed, so backtrack to the previous column
+            self._uncover(header)
+            stack.pop()
+            if not stack:
+                return False
+            descend = False
+
+    def choices(self) -> List[tuple]:
+        """
+        :return: the (row, column, value) choices of the solution found by search
+        """
+
+        return [self.choice[node] for node in self.solution]
+
+
+def solve_sudoku_dlx(board: np.array, stats: SearchStats = None) -> np.array:
+    """
+    Solve a clue grid as an exact cover problem with dancing links
+
+    :param board: numpy array of a n x n int board or grid in range [1..n], 0 for empty cells
+    :param stats: SearchStats to count the search nodes in, or None to not count them (the hooks are not called)
+    :return: the solved sudoku or an array filled with -1 indicating we couldn't find a solution
+    """
+
+    dancing_links = DancingLinks(board)
+    found = dancing_links.search()
+    if stats is not None:
+        stats.nodes += dancing_links.nodes
+    if not found:
+        return np.full(board.shape, -1)
+
+    solution = np.copy(board)
+    for row, column, n in dancing_links.choices():
+        solution[row][column] = n
+    return solution
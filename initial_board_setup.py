@@ -1,33 +1,45 @@
 import numpy as np
-from typing import Tuple
-from board_functions import BoardFunctions
+from typing import Iterable, Tuple
+from board_functions import BoardFunctions, box_size_of
+from constraint_propagation import ConstraintPropagation, RULES
 
 
 class InitialBoardSetup:
 
-    def __init__(self, board: np.array):
-        self.board = board
+    def __init__(self, board: np.array, rules: Iterable[str] = RULES, sample_every: int = 0):
+        """
+        :param board: n x n board or grid in range [1..n], where n is 9, 16, 25, ..., as a numpy array of any number type or a list of lists
+        :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) used on the initial board
+        :param sample_every: if n > 0, time the phases of every n-th propagation call (see SearchStats.sample_every)
+        """
+        # The propagation engines build bitmasks with 1 << (n - 1), so the values have to be python ints once they are in
+        # lists, which also makes float boards (like data/*_solution.npy) and lists of lists work
+        self.board = np.asarray(board).astype(np.int64)
+        self.box_size = box_size_of(board)
 
-        # Initialise the board functions object so we can call is_valid_pos, propagate and deal_with_1_picks functions
-        self.board_functions = BoardFunctions()
+        # Initialise the board functions object for the peers and candidate tables of the board's size
+        self.board_functions = BoardFunctions(self.box_size)
+        # Initialise the propagation engine that propagates the already assigned cells
+        self.constraint_propagation = ConstraintPropagation(rules, sample_every=sample_every, box_size=self.box_size)
 
-    def get_changed_boards(self) -> Tuple[np.array, list]:
+    def get_changed_boards(self) -> Tuple[np.array, np.array]:
         """
         First check if the board is valid, it isn't return None to indicate that this board is invalid and therefore has no solution.
-        Secondly, initialise the possible actions board so that we know what options we have instead of trying all numbers from 0 to 9.
-        Lastly, propagate the effects of already assigned cells in hope of making life easier for us
+        Secondly, initialise the possible actions board so that we know what options we have instead of trying all numbers from 1 to n.
+        Lastly, propagate the effects of already assigned cells in hope of making life easier for us, which also catches
+        boards that have no solution because propagation leads to a contradiction
 
         :return: a tuple containing the propagated board and possible_actions_board, or None if board is invalid
         """
 
-        if not self._is_board_valid():
+        if not self.is_board_valid():
             return None
 
         possible_actions_board = self._init_possible_actions_board()
 
         return self._initial_propagation(self.board, possible_actions_board)
 
-    def _is_board_valid(self) -> bool:
+    def is_board_valid(self) -> bool:
         """
         Check that every initially defined cell has a valid value.
         Check if the value of the cell doesn't occur vertically, horizontally or in the position's box
@@ -35,54 +47,46 @@ class InitialBoardSetup:
         :return: boolean saying whether all assigned positions are valid
         """
 
-        for row in range(len(self.board)):
-            for column in range(len(self.board[0])):
-                # if found a cell that is not 0 (i.e. an assigned cell), we have to check if its position is valid
-                cell_value = self.board[row][column]
-                if cell_value > 0:
-                    if not self.board_functions.is_valid_pos(self.board, (row, column), cell_value):
+        # Walk the precomputed peers of every cell on a flat list, rather than scanning the row, column and box of every cell
+        board = self.board.ravel().tolist()
+        peers = self.board_functions.geometry.peers
+        for index, cell_value in enumerate(board):
+            # if found a cell that is not 0 (i.e. an assigned cell), we have to check if its position is valid
+            if cell_value > 0:
+                for peer in peers[index]:
+                    if board[peer] == cell_value:
                         return False
         return True
 
-    def _init_possible_actions_board(self) -> list:
+    def _init_possible_actions_board(self) -> np.array:
         """
-        Create a 3D array such that for each possible_actions_board[{row}][{column}] we get a list of numbers we can input on the board at that position
+        Create a 2D array of candidate bitmasks such that possible_actions_board[{row}][{column}] has a bit set for every number we can input on the board at that position
 
-        :return: 3D array
+        :return: 2D array of bitmasks
         """
 
-        possible_actions_board = []
-        for row in range(len(self.board[0])):
-            column_list = []
-            for column in range(len(self.board[0])):
-                if self.board[row][column] == 0:
-                    column_list.append([1, 2, 3, 4, 5, 6, 7, 8, 9])
-                else:
-                    column_list.append([])
-            possible_actions_board.append(column_list)
-        return possible_actions_board
-
-    def _initial_propagation(self, board: np.array, possible_actions_board: list) -> Tuple[np.array, list]:
+        # Every unassigned cell can initially take any of the numbers 1 to n, assigned cells take none
+        geometry = self.board_functions.geometry
+        return np.where(self.board == 0, geometry.all_candidates, 0).astype(geometry.mask_dtype)
+
+    def _initial_propagation(self, board: np.array, possible_actions_board: np.array) -> Tuple[np.array, np.array]:
         """
         For every initially assigned cell propagate the effects of that cell being assigned the value that it has
         e.g. if we have a 1 at position (0,0) remove the possibility of putting a 1 in unassigned cells, in the first row and the first column, as well as the cells in the box that (0,0) is part of
-        Additionally, if at any point we find that we have only one option for a cell assign the value to the cell.
+        Additionally, the enabled propagation rules are applied until they can't make any more progress,
+        e.g. if we find that we have only one option for a cell assign the value to the cell.
 
-        :param board: numpy array of a n x n int board or grid in range [1..9]
-        :param possible_actions_board: a 3D list such that for each possible_actions_board[{row}][{column}] we get a list of numbers we can input on the board at that position
-        :return: a tuple containing the propagated board and possible_actions_board
+        :param board: numpy array of a n x n int board or grid in range [1..n]
+        :param possible_actions_board: numpy array of a n x n candidate bitmasks
+        :return: a tuple containing the propagated board and possible_actions_board, or None if propagation found a contradiction
         """
 
-        new_board = np.copy(board)
-        new_possible_actions_board = list.copy(possible_actions_board)
-        for row in range(len(new_board)):
-            for column in range(len(new_board[0])):
-                # If defined
-                temp_value = new_board[row][column]
-                if temp_value != 0:
-                    new_board, new_possible_actions_board = self.board_functions.propagate(new_board,
-                                                                                           new_possible_actions_board,
-                                                                                           (row, column), temp_value)
-                    new_board, new_possible_actions_board = self.board_functions.deal_with_1_picks(new_board,
-                                                                                                   new_possible_actions_board)
-        return new_board, new_possible_actions_board
+        # The propagation engine works on flat lists as single cell reads and writes on lists are much quicker
+        propagated = self.constraint_propagation.propagate_board(board.ravel().tolist(), possible_actions_board.ravel().tolist())
+        # Propagation ran into a contradiction, so the board can't be solved even though no clues clash directly
+        if propagated is None:
+            return None
+
+        new_board, new_possible_actions_board = propagated
+        return (np.array(new_board, dtype=board.dtype).reshape(board.shape),
+                np.array(new_possible_actions_board, dtype=possible_actions_board.dtype).reshape(possible_actions_board.shape))
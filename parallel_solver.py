@@ -0,0 +1,214 @@
+import multiprocessing
+import os
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, List, Tuple
+from board_functions import box_size_of
+from constraint_propagation import ConstraintPropagation, RULES
+from initial_board_setup import InitialBoardSetup
+from search_stats import SearchStats
+from solver import STRATEGIES
+from sudoku_board_state import SudokuBoardState
+
+# Event set by the parent process once a subtree has been solved, shared with every worker of the pool
+_cancel_event = None
+
+
+class SearchCancelled(Exception):
+    """
+    Raised inside a worker when another subtree has already been solved, to stop its search
+    """
+
+
+def _init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+def _check_cancelled(**details):
+    # Called on every expanded cell, checking the event only takes a lock so it's cheap next to propagation
+    if _cancel_event.is_set():
+        raise SearchCancelled()
+
+
+def _solve_subtree(board: np.array, possible_actions_board: np.array, rules: Tuple[str], strategy: str, options: dict) -> Tuple[np.array, int]:
+    """
+    Search one subtree in a worker process, giving up as soon as the cancel event is set
+
+    :param board: numpy array of the subtree's root board
+    :param possible_actions_board: numpy array of the candidate bitmasks of the subtree's root
+    :param rules: names of the constraint propagation rules
+    :param strategy: name of the strategy in solver.STRATEGIES
+    :param options: extra keyword arguments for the strategy
+    :return: tuple of the solution (an array filled with -1 if the subtree has none, None if it was cancelled) and the search nodes it took
+    """
+
+    # The expand hook is the only place the search calls back into, so it is also where it is stopped
+    stats = SearchStats(on_expand=_check_cancelled)
+    try:
+        solution = STRATEGIES[strategy](board, possible_actions_board, rules=rules, stats=stats, **options)
+    except SearchCancelled:
+        return None, stats.nodes
+    return solution, stats.nodes
+
+
+def split_search(board: np.array, possible_actions_board: np.array, subtrees: int, rules: Iterable[str] = RULES,
+                 max_nodes: int = None, stats: SearchStats = None) -> Tuple[np.array, List[SudokuBoardState]]:
+    """
+    Expand the top levels of the depth-first search one whole level at a time until there are at least `subtrees` states
+    or max_nodes values have been tried, each state being the root of an independent subtree. The states stay in the
+    order the depth-first search would visit them. Only the states that get expanded are checked for a solution, a solved
+    subtree root is left to the strategy searching it, which returns it straight away.
+
+    :param board: numpy array of a n x n int board, already checked and propagated
+    :param possible_actions_board: numpy array of the n x n candidate bitmasks of the board
+    :param subtrees: number of subtrees to aim for
+    :param rules: names of the constraint propagation rules applied after every assignment
+    :param max_nodes: largest number of values to try while splitting, or None for no limit
+    :param stats: SearchStats to record the splitting in, or None to not record anything
+    :return: tuple of the solution if one was found while splitting (None otherwise) and the subtree root states
+    """
+
+    constraint_propagation = ConstraintPropagation(rules, sample_every=stats.sample_every if stats is not None else 0, box_size=box_size_of(board))
+    level = [SudokuBoardState(current_pos=(0, 0), board=board, possible_actions_board=possible_actions_board,
+                              constraint_propagation=constraint_propagation)]
+    nodes = 0
+    try:
+        while level and len(level) < subtrees and (max_nodes is None or nodes < max_nodes):
+            next_level = []
+            for i, state in enumerate(level):
+                # Out of budget half way through the level, the states not expanded yet come after the children of
+                # the expanded ones in the depth-first order, so they become subtree roots as they are
+                if max_nodes is not None and nodes >= max_nodes:
+                    next_level.extend(level[i:])
+                    break
+                if state.is_goal_state():
+                    return state.get_board(), []
+                pos, n_options = state.possible_actions()
+                if stats is not None:
+                    stats.expand(pos, n_options, state.depth)
+                # Largest value first, the same order solve_sudoku tries them in
+                for n in reversed(n_options):
+                    nodes += 1
+                    if stats is not None:
+                        stats.assign(pos, n, state.depth)
+                    child = state.next_state(pos, n)
+                    if child is not None:
+                        next_level.append(child)
+                    elif stats is not None:
+                        stats.contradiction(pos, n, state.depth)
+            level = next_level
+
+        return None, level
+    finally:
+        if stats is not None:
+            stats.add_propagation(constraint_propagation)
+
+
+class ParallelSolver:
+    """
+    Solves a single puzzle on several cores by splitting the top of its search tree into subtrees and searching them
+    in a process pool. There are several subtrees per worker and they sit in the pool's shared queue, so a worker that
+    finishes a small subtree takes the next one instead of idling while another works through a big one.
+    As soon as one subtree is solved the rest are cancelled, and a puzzle only gets -1 once every subtree has run out.
+    The pool is kept between puzzles, so use it as a context manager or call close() when done.
+    """
+
+    def __init__(self, workers: int = None, subtrees_per_worker: int = 8, strategy: str = "dfs", rules: Iterable[str] = RULES,
+                 split_nodes: int = None, **options):
+        """
+        :param workers: number of worker processes, the number of CPUs by default
+        :param subtrees_per_worker: how many subtrees to split each puzzle into per worker
+        :param split_nodes: largest number of values tried while splitting a puzzle, one per worker by default
+        :param strategy: name of the strategy in solver.STRATEGIES that searches each subtree
+        :param rules: names of the constraint propagation rules
+        :param options: extra keyword arguments for the strategy
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', expected one of {list(STRATEGIES)}")
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.subtrees_per_worker = subtrees_per_worker
+        # A puzzle whose top levels are mostly pruned by propagation would otherwise be searched in the parent while
+        # splitting, so the splitting stops after this many values and hands over however many subtrees it has
+        self.split_nodes = split_nodes if split_nodes is not None else self.workers
+        self.strategy = strategy
+        self.rules = tuple(rules)
+        self.options = options
+        # Number of puzzles that were handed to the pool rather than solved or ruled out while splitting
+        self.pooled = 0
+        self.cancel_event = multiprocessing.Event()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.cancel_event,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def solve(self, sudoku: np.array, stats: SearchStats = None) -> np.array:
+        """
+        :param sudoku: n x n numpy array, 0 for empty cells
+        :param stats: SearchStats to add the search nodes of the splitting and of every subtree to (including cancelled ones), or None
+        :return: the solved sudoku or an array filled with -1 indicating we couldn't find a solution
+        """
+
+        initial_board_setup_object = InitialBoardSetup(sudoku, self.rules, stats.sample_every if stats is not None else 0)
+        init_output = initial_board_setup_object.get_changed_boards()
+        if stats is not None:
+            stats.add_propagation(initial_board_setup_object.constraint_propagation)
+        if init_output is None:
+            return np.full(initial_board_setup_object.board.shape, -1)
+
+        board, possible_actions_board = init_output
+        solution, subtrees = split_search(board, possible_actions_board, self.workers * self.subtrees_per_worker, self.rules, self.split_nodes, stats)
+        if solution is not None:
+            return solution
+        if not subtrees:
+            return np.full(initial_board_setup_object.board.shape, -1)
+
+        self.pooled += 1
+        pending = {self.executor.submit(_solve_subtree, state.board, state.possible_actions_board, self.rules, self.strategy, self.options)
+                   for state in subtrees}
+        solution = None
+        nodes = 0
+        try:
+            while pending and solution is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subtree_solution, subtree_nodes = future.result()
+                    nodes += subtree_nodes
+                    if subtree_solution is not None and not (subtree_solution == -1).all():
+                        solution = subtree_solution
+        finally:
+            # Drop the subtrees that haven't started and stop the running ones, then wait for them so that
+            # the event can be cleared without a stale search of this puzzle carrying on into the next one
+            self.cancel_event.set()
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    nodes += future.result()[1]
+            self.cancel_event.clear()
+
+        if stats is not None:
+            stats.nodes += nodes
+        if solution is None:
+            return np.full(initial_board_setup_object.board.shape, -1)
+        return solution
+
+
+def solve_parallel(sudoku: np.array, workers: int = None, **kwargs) -> np.array:
+    """
+    Solve a single puzzle with a ParallelSolver that is only used for it, which includes the cost of starting the pool
+
+    :param sudoku: n x n numpy array, 0 for empty cells
+    :param workers: number of worker processes, the number of CPUs by default
+    :param kwargs: other keyword arguments for ParallelSolver
+    :return: the solved sudoku or an array filled with -1 indicating we couldn't find a solution
+    """
+
+    with ParallelSolver(workers, **kwargs) as parallel_solver:
+        return parallel_solver.solve(sudoku)
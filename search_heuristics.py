@@ -0,0 +1,97 @@
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from trail_search import TrailSearch
+
+
+def row_major(search: "TrailSearch", index: int) -> int:
+    """
+    Pick the next unassigned cell in row-major order after the last cell we branched on, like SudokuBoardState does
+
+    :param search: the running search
+    :param index: flat cell index of the last cell we branched on
+    :return: flat cell index to branch on next or None if every cell is assigned
+    """
+
+    board = search.board
+    for i in range(index, len(board)):
+        if board[i] == 0:
+            return i
+    return None
+
+
+def minimum_remaining_values(search: "TrailSearch", index: int) -> int:
+    """
+    Pick the unassigned cell with the fewest options left (ties go to the first cell in row-major order).
+    The search keeps the unassigned cells bucketed by their number of options, so this only looks at the smallest non-empty bucket.
+
+    :param search: the running search
+    :param index: flat cell index of the last cell we branched on (unused)
+    :return: flat cell index to branch on next or None if every cell is assigned
+    """
+
+    for bucket in search.buckets:
+        if bucket:
+            return min(bucket)
+    return None
+
+
+def minimum_remaining_values_degree(search: "TrailSearch", index: int) -> int:
+    """
+    Pick the unassigned cell with the fewest options left, breaking ties with the cell that has the most unassigned peers
+    as assigning it constrains the most other cells.
+
+    :param search: the running search
+    :param index: flat cell index of the last cell we branched on (unused)
+    :return: flat cell index to branch on next or None if every cell is assigned
+    """
+
+    board = search.board
+    peers = search.geometry.peers
+    for bucket in search.buckets:
+        if bucket:
+            # Sorting first means equal degrees still go to the first cell in row-major order
+            return max(sorted(bucket), key=lambda cell: sum(1 for peer in peers[cell] if board[peer] == 0))
+    return None
+
+
+def natural_order(search: "TrailSearch", index: int) -> List[int]:
+    """
+    :param search: the running search
+    :param index: flat cell index we are branching on
+    :return: the cell's options in ascending order
+    """
+
+    mask = search.possible_actions_board[index]
+    return [n for n in range(1, search.size + 1) if mask >> (n - 1) & 1]
+
+
+def least_constraining_value(search: "TrailSearch", index: int) -> List[int]:
+    """
+    Order the cell's options so that the value removing the fewest options from its peers is tried first
+
+    :param search: the running search
+    :param index: flat cell index we are branching on
+    :return: the cell's options, least constraining first
+    """
+
+    possible_actions_board = search.possible_actions_board
+    peer_masks = [possible_actions_board[peer] for peer in search.geometry.peers[index]]
+    # Count how many peers would lose each option, python's sort is stable so ties stay in ascending order
+    return sorted(natural_order(search, index), key=lambda n: sum(mask >> (n - 1) & 1 for mask in peer_masks))
+
+
+# Ways of choosing the cell to branch on, selected with the variable_ordering option of the trail and dfs strategies
+# (the functions here work on a TrailSearch, SudokuBoardState implements the same orderings for solve_sudoku)
+VARIABLE_ORDERINGS = {
+    "row_major": row_major,
+    "mrv": minimum_remaining_values,
+    "mrv_degree": minimum_remaining_values_degree,
+}
+
+# Ways of ordering the values tried for that cell, selected with the value_ordering option of the trail and dfs strategies
+# (SudokuBoardState implements them for solve_sudoku, like the cell orderings)
+VALUE_ORDERINGS = {
+    "natural": natural_order,
+    "lcv": least_constraining_value,
+}
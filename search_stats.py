@@ -0,0 +1,125 @@
+import json
+from typing import Callable, Tuple
+
+
+class SearchStats:
+    """
+    Counters, hooks and an optional trace filled in by a solve when a SearchStats object is passed to sudoku_solver(stats=...).
+    Solves without a SearchStats object skip all of this, so instrumentation costs nothing unless it is asked for.
+
+    Hooks are called with keyword arguments describing the event:
+    * on_expand(pos, values, depth) - a cell is branched on with the given values to try
+    * on_assign(pos, n, depth) - a value is tried for the cell (a node of the search tree)
+    * on_backtrack(pos, depth) - every value for the cell has been tried, so the search goes back up
+    * on_contradiction(pos, n, depth) - propagating the value ran into a contradiction, so the node is pruned
+    """
+
+    def __init__(self, on_expand: Callable = None, on_assign: Callable = None, on_backtrack: Callable = None,
+                 on_contradiction: Callable = None, trace: bool = False, sample_every: int = 0):
+        """
+        :param on_expand: hook called when a cell is branched on
+        :param on_assign: hook called when a value is tried for a cell
+        :param on_backtrack: hook called when every value of a cell has been tried
+        :param on_contradiction: hook called when a value leads to a contradiction
+        :param trace: whether to record every event so the search tree can be dumped with dump_trace
+        :param sample_every: if n > 0, time the propagation phases of every n-th propagation call
+        """
+        self.hooks = {"expand": on_expand, "assign": on_assign, "backtrack": on_backtrack, "contradiction": on_contradiction}
+        self.sample_every = sample_every
+        # List of event dictionaries when tracing, None otherwise
+        self.trace = [] if trace else None
+
+        # Nodes of the search tree, i.e. values tried by a search strategy or rows chosen by dancing links
+        self.nodes = 0
+        # Cells branched on, branches abandoned and values pruned by a contradiction
+        self.expanded = 0
+        self.backtracks = 0
+        self.contradictions = 0
+        # Largest size of the depth-first search frontier, or largest depth of the trail search stack
+        self.max_frontier = 0
+        # States skipped by solve_sudoku because their board was already explored or in the frontier
+        self.duplicates = 0
+        # States forgotten by the transposition table of solve_sudoku to stay under its size cap
+        self.evictions = 0
+        # Propagation work: calls to the engine, options removed from cells, cells found with a single option
+        # (naked or hidden), how often each rule fired and, when sampling, the seconds spent in each phase
+        self.propagate_calls = 0
+        self.eliminations = 0
+        self.singles = 0
+        self.rule_counts = {}
+        self.phase_times = {}
+
+    def _event(self, event: str, **details):
+        if self.trace is not None:
+            self.trace.append(dict(event=event, **details))
+        hook = self.hooks[event]
+        if hook is not None:
+            hook(**details)
+
+    def expand(self, pos: Tuple[int, int], values: list, depth: int):
+        self.expanded += 1
+        self._event("expand", pos=pos, values=list(values), depth=depth)
+
+    def assign(self, pos: Tuple[int, int], n: int, depth: int):
+        self.nodes += 1
+        self._event("assign", pos=pos, n=n, depth=depth)
+
+    def backtrack(self, pos: Tuple[int, int], depth: int):
+        self.backtracks += 1
+        self._event("backtrack", pos=pos, depth=depth)
+
+    def contradiction(self, pos: Tuple[int, int], n: int, depth: int):
+        self.contradictions += 1
+        self._event("contradiction", pos=pos, n=n, depth=depth)
+
+    def frontier_size(self, size: int):
+        if size > self.max_frontier:
+            self.max_frontier = size
+
+    def add_propagation(self, constraint_propagation):
+        """
+        Add the counters a ConstraintPropagation engine has collected, called once at the end of a solve
+
+        :param constraint_propagation: the engine used by the solve
+        """
+
+        self.propagate_calls += constraint_propagation.calls
+        self.eliminations += constraint_propagation.eliminations
+        self.singles += constraint_propagation.counts["naked_singles"] + constraint_propagation.counts["hidden_singles"]
+        for rule, count in constraint_propagation.counts.items():
+            self.rule_counts[rule] = self.rule_counts.get(rule, 0) + count
+        for phase, seconds in constraint_propagation.timings.items():
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+
+    def summary(self) -> dict:
+        """
+        :return: dictionary of all the counters, e.g. to print or save as JSON
+        """
+
+        return {
+            "nodes": self.nodes,
+            "expanded": self.expanded,
+            "backtracks": self.backtracks,
+            "contradictions": self.contradictions,
+            "max_frontier": self.max_frontier,
+            "duplicates": self.duplicates,
+            "evictions": self.evictions,
+            "propagate_calls": self.propagate_calls,
+            "eliminations": self.eliminations,
+            "singles": self.singles,
+            "rule_counts": dict(self.rule_counts),
+            "phase_times": dict(self.phase_times),
+        }
+
+    def dump_trace(self, path: str):
+        """
+        Write the recorded events to a file, one JSON object per line in the order they happened
+
+        :param path: file to write to
+        """
+
+        if self.trace is None:
+            raise ValueError("This SearchStats was not created with trace=True")
+        with open(path, "w") as f:
+            for event in self.trace:
+                f.write(json.dumps(event) + "\n")
@@ -0,0 +1,363 @@
+import sqlite3
+import time
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import permutations, product
+from typing import Callable, NamedTuple, Tuple
+from board_functions import box_size_of
+
+
+def _line_orders(box_size: int = 3) -> np.array:
+    """
+    Every order of the rows (or columns) of a board that keeps the bands (or stacks) together,
+    i.e. the bands can be swapped and the rows within each band can be swapped
+
+    :param box_size: width and height of a box
+    :return: numpy array of shape ((box_size!) ^ (box_size + 1), box_size ^ 2), each row is an order of the lines
+    """
+
+    orders = []
+    for bands in permutations(range(box_size)):
+        for within in product(permutations(range(box_size)), repeat=box_size):
+            orders.append([band * box_size + line for band, lines in zip(bands, within) for line in lines])
+    return np.array(orders)
+
+
+# The 1296 column orders of a 9 x 9 board, the canonical form picks one of them for the whole board
+COLUMN_ORDERS = _line_orders(3)
+# Place values to turn a row of 9 labels (each 0 to 9) into a single number, so rows compare as integers in lexicographic order
+_ROW_PLACES = 10 ** np.arange(8, -1, -1, dtype=np.int64)
+# Most partial orderings kept while canonicalising, only very symmetrical clue grids (e.g. nearly empty ones) go past it.
+# Those get the exact puzzle as their key instead, which can only make equivalent puzzles miss each other in the cache,
+# never give a wrong answer, as the key of a grid is then the grid itself just like a canonical key is
+MAX_BRANCHES = 64
+# Grids with fewer clues are so symmetrical that canonicalising them takes far longer than solving them, so they also
+# get the exact puzzle as their key (17 is the fewest clues a 9 x 9 puzzle with a unique solution can have)
+MIN_CLUES = 17
+
+
+class Transform(NamedTuple):
+    """
+    A symmetry of the board: optionally transpose, then reorder the rows and columns, then relabel the digits
+    """
+
+    transpose: bool
+    # New position i of a row or column holds old row or column rows[i] or columns[i]
+    rows: np.array
+    columns: np.array
+    # digits[old digit] is the new digit, 0 maps to 0 so empty cells stay empty
+    digits: np.array
+
+    def apply(self, board: np.array) -> np.array:
+        """
+        :param board: n x n board in the caller's orientation
+        :return: the board in the canonical orientation
+        """
+
+        board = board.T if self.transpose else board
+        return self.digits[board[self.rows][:, self.columns]].astype(board.dtype)
+
+    def invert(self, board: np.array) -> np.array:
+        """
+        :param board: n x n board in the canonical orientation
+        :return: the board in the caller's orientation
+        """
+
+        inverse_digits = np.zeros_like(self.digits)
+        inverse_digits[self.digits] = np.arange(len(self.digits))
+        original = np.empty_like(board)
+        original[np.ix_(self.rows, self.columns)] = inverse_digits[board]
+        return original.T if self.transpose else original
+
+
+def random_transform(generator: np.random.Generator, box_size: int = 3) -> Transform:
+    """
+    Pick a random symmetry of the board, e.g. to make equivalent copies of a puzzle that only a canonical cache recognises
+
+    :param generator: numpy random generator to draw from
+    :param box_size: width and height of a box
+    :return: Transform that maps a board to an equivalent board
+    """
+
+    def line_order() -> np.array:
+        bands = generator.permutation(box_size)
+        return np.concatenate([band * box_size + generator.permutation(box_size) for band in bands])
+
+    digits = np.concatenate([[0], generator.permutation(box_size * box_size) + 1])
+    return Transform(bool(generator.integers(2)), line_order(), line_order(), digits)
+
+
+@lru_cache(maxsize=None)
+def _empty_cell_codes() -> np.array:
+    """
+    Empty cells come before any digit, so the row that comes first in the canonical grid is always one whose empty cells
+    are furthest to the left. Working out where they end up for every pattern of filled cells and every column order once
+    means most candidate rows are ruled out with a table lookup, without labelling their digits.
+
+    :return: (512, 1296) array indexed by the bitmask of filled columns (bit c for column c) and the column order,
+             the codes compare in the same order as the rows' patterns of empty cells
+    """
+
+    filled = (np.arange(512)[:, None] >> np.arange(9)) & 1
+    return filled[:, COLUMN_ORDERS] @ _ROW_PLACES
+
+
+def _relabel(values: np.array, labels: np.array, next_label: np.array) -> Tuple[np.array, np.array, np.array]:
+    """
+    Give every digit of a row that hasn't been seen yet the next free label, separately for every column order
+
+    :param values: (orders, 9) array of the row in each column order
+    :param labels: (orders, 10) array of the label given to each digit so far (0 while unseen)
+    :param next_label: (orders,) array of the next free label
+    :return: tuple of the relabelled row and the updated labels and next free labels
+    """
+
+    labels = labels.copy()
+    next_label = next_label.copy()
+    # Index into the flattened labels, which is quicker than indexing rows and columns separately
+    flat_labels = labels.reshape(-1)
+    positions = values.T + np.arange(len(values)) * labels.shape[1]
+    relabelled = np.empty_like(values)
+    for column, position in enumerate(positions):
+        label = flat_labels[position]
+        unseen = (label == 0) & (values[:, column] != 0)
+        if unseen.any():
+            flat_labels[position[unseen]] = next_label[unseen]
+            next_label += unseen
+            label = flat_labels[position]
+        relabelled[:, column] = label
+    return relabelled, labels, next_label
+
+
+def _smallest(candidates: list) -> list:
+    """
+    :param candidates: list of tuples starting with an array of row codes, one per column order
+    :return: the candidates that reach the smallest code, each with only the positions of its column orders that reach it
+    """
+
+    smallest = min(codes.min() for codes, *_ in candidates)
+    kept = []
+    for codes, *rest in candidates:
+        keep = codes == smallest
+        if keep.any():
+            kept.append((keep, *rest))
+    return kept
+
+
+def _exact_key(puzzle: np.array) -> Tuple[bytes, Transform]:
+    """
+    :param puzzle: n x n numpy array, 0 for empty cells
+    :return: tuple of the puzzle itself as the key and the identity Transform
+    """
+
+    size = len(puzzle)
+    identity = np.arange(size)
+    return puzzle.astype(np.int8).tobytes(), Transform(False, identity, identity, np.arange(size + 1))
+
+
+def canonicalize(puzzle: np.array) -> Tuple[bytes, Transform]:
+    """
+    Find the canonical form of a 9 x 9 clue grid, which is the same for every puzzle that only differs from it by
+    relabelling the digits, reordering rows within bands, columns within stacks, bands or stacks, or transposing.
+    The canonical form is the smallest grid that a symmetry can turn the puzzle into, after numbering the digits in the order
+    they first appear. Grids are compared row by row, first on where the row's empty cells are and then on its digits.
+    It is built one row at a time, only keeping the row orders and column orders that tie for the smallest grid so far.
+    Other board sizes, grids with fewer than MIN_CLUES clues and grids with more than MAX_BRANCHES tied orderings
+    aren't canonicalised, their key is the board itself.
+
+    :param puzzle: n x n numpy array, 0 for empty cells
+    :return: tuple of the canonical key and the Transform that turns the puzzle into its canonical form
+    """
+
+    if box_size_of(puzzle) != 3 or np.count_nonzero(puzzle) < MIN_CLUES:
+        return _exact_key(puzzle)
+
+    grid = np.asarray(puzzle, dtype=np.int64)
+    empty_cell_codes = _empty_cell_codes()
+    everything = np.arange(len(COLUMN_ORDERS))
+    no_labels = np.zeros((len(everything), 10), dtype=np.int64)
+    first_label = np.ones(len(everything), dtype=np.int64)
+    # Each branch is (transposed, oriented grid, bitmask of the filled columns of each row, rows picked so far,
+    # surviving column orders, their digit labels, their next free label)
+    branches = [(transpose, oriented, (oriented != 0) @ (1 << np.arange(9)), [], everything, no_labels, first_label)
+                for transpose, oriented in ((False, grid), (True, grid.T))]
+
+    for position in range(9):
+        candidates = []
+        for branch in branches:
+            transpose, oriented, filled_masks, rows, orders, labels, next_label = branch
+            # The first row of a band can come from any band not used yet, the others have to come from the same band
+            if position % 3 == 0:
+                used_bands = {row // 3 for row in rows}
+                allowed = [row for row in range(9) if row // 3 not in used_bands]
+            else:
+                band = rows[-1] // 3
+                allowed = [row for row in range(band * 3, band * 3 + 3) if row not in rows]
+            for row in allowed:
+                candidates.append((empty_cell_codes[filled_masks[row], orders], branch, row))
+
+        # Only the rows and column orders that put the empty cells furthest left have their digits labelled and compared
+        labelled = []
+        for keep, (transpose, oriented, filled_masks, rows, orders, labels, next_label), row in _smallest(candidates):
+            values = oriented[row][COLUMN_ORDERS[orders[keep]]]
+            relabelled, new_labels, new_next_label = _relabel(values, labels[keep], next_label[keep])
+            labelled.append((relabelled @ _ROW_PLACES, transpose, oriented, filled_masks, rows + [row], orders[keep], new_labels, new_next_label))
+
+        branches = [(transpose, oriented, filled_masks, rows, orders[keep], labels[keep], next_label[keep])
+                    for keep, transpose, oriented, filled_masks, rows, orders, labels, next_label in _smallest(labelled)]
+        if len(branches) > MAX_BRANCHES:
+            return _exact_key(puzzle)
+
+    # Every branch left gives the same grid, so take the first one
+    transpose, oriented, filled_masks, rows, orders, labels, next_label = branches[0]
+    digits = labels[0]
+    # Digits without a clue get the labels that are left over, so the relabelling is a full permutation
+    free_labels = iter(label for label in range(1, 10) if label not in set(digits[1:].tolist()))
+    for digit in range(1, 10):
+        if digits[digit] == 0:
+            digits[digit] = next(free_labels)
+
+    transform = Transform(transpose, np.array(rows), COLUMN_ORDERS[orders[0]], digits)
+    return transform.apply(puzzle).astype(np.int8).tobytes(), transform
+
+
+class SolutionCache:
+    """
+    Cache of solutions keyed by the canonical form of the puzzle, so a puzzle that is a relabelled, reordered or transposed
+    copy of one solved before is answered by transforming the stored solution back instead of searching again.
+    Solutions are kept in an in-memory LRU and optionally in a SQLite file that outlives the process,
+    and puzzles without a solution are cached as well.
+    """
+
+    def __init__(self, max_size: int = 10000, path: str = None):
+        """
+        :param max_size: largest number of canonical solutions kept in memory
+        :param path: SQLite file to also store every solution in, or None to only keep them in memory
+        """
+        self.max_size = max_size
+        # Canonical key to (canonical solution or None if there is none, seconds it took to solve), least recently used first
+        self.memory = OrderedDict()
+        # Puzzle exactly as it was asked for to its (canonical key, Transform), so exact repeats skip canonicalising
+        self.canonical_forms = OrderedDict()
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (key BLOB PRIMARY KEY, solution BLOB, seconds REAL)")
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # Seconds spent solving the misses, and seconds saved on hits (the time the solve took minus the time of the lookup)
+        self.solve_time = 0.0
+        self.time_saved = 0.0
+
+    def solve(self, sudoku: np.array, solve_function: Callable[[np.array], np.array]) -> np.array:
+        """
+        Return the cached solution of the puzzle, or solve its canonical form and cache that
+
+        :param sudoku: n x n numpy array (or list of lists), 0 for empty cells
+        :param solve_function: function that solves a puzzle like sudoku_solver, called with the canonical form on a miss
+        :return: the solution in the caller's orientation, or an array filled with -1 if there isn't one
+        """
+
+        # Transforms index with the values, so float boards and lists of lists are made into ints like InitialBoardSetup does
+        sudoku = np.asarray(sudoku).astype(np.int64)
+        # Values outside [0..n] can't be relabelled, the solver rejects those puzzles anyway
+        if sudoku.min() < 0 or sudoku.max() > len(sudoku):
+            return solve_function(sudoku)
+
+        start_time = time.perf_counter()
+        key, transform = self._canonicalize(sudoku)
+        entry = self._lookup(key)
+        if entry is not None:
+            solution, seconds = entry
+            answer = np.full(sudoku.shape, -1) if solution is None else transform.invert(solution).astype(sudoku.dtype)
+            self.time_saved += seconds - (time.perf_counter() - start_time)
+            return answer
+
+        self.misses += 1
+        solve_start_time = time.perf_counter()
+        solution = solve_function(transform.apply(sudoku))
+        seconds = time.perf_counter() - solve_start_time
+        self.solve_time += seconds
+        # Puzzles without a solution are stored as None
+        solution = None if (solution == -1).all() else np.asarray(solution, dtype=sudoku.dtype)
+        self._store(key, solution, seconds)
+        return np.full(sudoku.shape, -1) if solution is None else transform.invert(solution).astype(sudoku.dtype)
+
+    def _canonicalize(self, sudoku: np.array) -> Tuple[bytes, Transform]:
+        raw = sudoku.astype(np.int8).tobytes()
+        canonical = self.canonical_forms.get(raw)
+        if canonical is None:
+            canonical = canonicalize(sudoku)
+            self.canonical_forms[raw] = canonical
+            if len(self.canonical_forms) > self.max_size:
+                self.canonical_forms.popitem(last=False)
+        else:
+            self.canonical_forms.move_to_end(raw)
+        return canonical
+
+    def _lookup(self, key: bytes) -> tuple:
+        """
+        :param key: canonical key of a puzzle
+        :return: tuple of the canonical solution (None if it has none) and the seconds it took to solve, or None on a miss
+        """
+
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry
+        if self.connection is None:
+            return None
+
+        row = self.connection.execute("SELECT solution, seconds FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.disk_hits += 1
+        size = round(len(key) ** 0.5)
+        solution = None if row[0] is None else np.frombuffer(row[0], dtype=np.int8).reshape(size, size).copy()
+        # Keep it in memory too, as it is likely to be asked for again
+        self._remember(key, (solution, row[1]))
+        return solution, row[1]
+
+    def _store(self, key: bytes, solution: np.array, seconds: float):
+        self._remember(key, (solution, seconds))
+        if self.connection is not None:
+            blob = None if solution is None else solution.astype(np.int8).tobytes()
+            self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)", (key, blob, seconds))
+            self.connection.commit()
+
+    def _remember(self, key: bytes, entry: tuple):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """
+        :return: fraction of the lookups answered from the cache
+        """
+
+        hits = self.memory_hits + self.disk_hits
+        return hits / (hits + self.misses) if hits + self.misses else 0.0
+
+    def summary(self) -> dict:
+        """
+        :return: dictionary of the cache counters, e.g. to print or save as JSON
+        """
+
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "solve_time": self.solve_time,
+            "time_saved": self.time_saved,
+        }
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
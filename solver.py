@@ -0,0 +1,228 @@
+import numpy as np
+from typing import Iterable
+from board_functions import box_size_of
+from constraint_propagation import ConstraintPropagation, RULES
+from dlx_solver import solve_sudoku_dlx
+from initial_board_setup import InitialBoardSetup
+from search_heuristics import VALUE_ORDERINGS, VARIABLE_ORDERINGS
+from search_stats import SearchStats
+from solution_cache import SolutionCache
+from sudoku_board_state import SudokuBoardState
+from trail_search import count_solutions_trail, solve_sudoku_trail
+from transposition_table import TranspositionTable
+
+
+def _next_state(frontier: list, seen: TranspositionTable, stats: SearchStats = None) -> SudokuBoardState:
+    """
+    Build the next state to explore from the pending move on top of the frontier, moving down the frontier whenever a
+    move runs out of values. Children are only built here, so siblings that are never reached are never copied or propagated.
+
+    :param frontier: list of pending moves [parent state, position, values still to try], the last one is tried first
+    :param seen: transposition table of the states already explored
+    :param stats: SearchStats to record the search in, or None to not record anything
+    :return: the next new state, or None if every pending move has been used up
+    """
+
+    while frontier:
+        parent, pos, values = frontier[-1]
+        # Every value for the cell has been tried, so go back to an earlier choice
+        if not values:
+            frontier.pop()
+            if stats is not None:
+                stats.backtrack(pos, parent.depth)
+            continue
+
+        # Taking values from the end tries the largest first, the same order as popping children built all at once
+        n = values.pop()
+        if stats is not None:
+            stats.assign(pos, n, parent.depth)
+        new_state = parent.next_state(pos, n)
+        # Propagating the assignment found a contradiction, so prune the state straight away
+        if new_state is None:
+            if stats is not None:
+                stats.contradiction(pos, n, parent.depth)
+            continue
+        # The state carries its hash, so checking if it has already been explored is a single O(1) lookup
+        if new_state.zobrist_key in seen:
+            if stats is not None:
+                stats.duplicates += 1
+            continue
+        seen.add(new_state.zobrist_key, new_state.depth)
+        return new_state
+    return None
+
+
+def solve_sudoku(board: np.array, possible_actions_board: np.array, rules: Iterable[str] = RULES, stats: SearchStats = None,
+                 table_size: int = 100000, eviction: str = "lru", variable_ordering: str = "row_major", value_ordering: str = "natural") -> np.array:
+    """
+    Using depth-first search with backtracking and in-built constraint propagation in an iterative manner.
+    The frontier holds pending moves rather than states, a child state is only built when the search gets to it.
+
+    :param board: numpy array of a n x n int board or grid in range [1..n]
+    :param possible_actions_board: numpy array of a n x n candidate bitmasks, bit (n - 1) of possible_actions_board[{row}][{column}] is set if we can input n at that position
+    :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) applied after every assignment
+    :param stats: SearchStats to record the search in, or None to not record anything
+    :param table_size: largest number of seen states the transposition table keeps
+    :param eviction: name of the transposition table eviction policy (see transposition_table.EVICTIONS)
+    :param variable_ordering: name of the cell ordering in search_heuristics.VARIABLE_ORDERINGS, row-major by default
+    :param value_ordering: name of the value ordering in search_heuristics.VALUE_ORDERINGS
+    :return: the solved sudoku or an array filled with -1 indicating we couldn't find a solution
+    """
+
+    if variable_ordering not in VARIABLE_ORDERINGS:
+        raise ValueError(f"Unknown variable ordering '{variable_ordering}', expected one of {list(VARIABLE_ORDERINGS)}")
+    if value_ordering not in VALUE_ORDERINGS:
+        raise ValueError(f"Unknown value ordering '{value_ordering}', expected one of {list(VALUE_ORDERINGS)}")
+
+    constraint_propagation = ConstraintPropagation(rules, sample_every=stats.sample_every if stats is not None else 0, box_size=box_size_of(board))
+    # We start at the top left (position 0,0)
+    current_state = SudokuBoardState(current_pos=(0,0), board=board, possible_actions_board=possible_actions_board,
+                                     constraint_propagation=constraint_propagation, variable_ordering=variable_ordering, value_ordering=value_ordering)
+    # Pending moves as [parent state, position, values still to try], at most one per level of the search
+    frontier = []
+    # Zobrist hashes of every state that has been explored, capped at table_size states
+    seen = TranspositionTable(table_size, eviction)
+    seen.add(current_state.zobrist_key, current_state.depth)
+
+    # Carry on looping till we are in the goal state or we fail to find a solution
+    while not current_state.is_goal_state():
+        # Get the position we are assigning and the value options for that position
+        pos, n_options = current_state.possible_actions()
+        if stats is not None:
+            stats.expand(pos, n_options, current_state.depth)
+        frontier.append([current_state, pos, n_options])
+        if stats is not None:
+            stats.frontier_size(len(frontier))
+
+        current_state = _next_state(frontier, seen, stats)
+        # If no pending move has a value left it means we reached a point of no solution
+        if current_state is None:
+            if stats is not None:
+                stats.add_propagation(constraint_propagation)
+                stats.evictions += seen.evictions
+            return np.full(board.shape, -1)
+
+    if stats is not None:
+        stats.add_propagation(constraint_propagation)
+        stats.evictions += seen.evictions
+    return current_state.get_board()
+
+
+# Search strategies that can be picked in sudoku_solver, each takes the set up board and possible actions board
+STRATEGIES = {
+    # Depth-first search that copies a SudokuBoardState for every child
+    "dfs": solve_sudoku,
+    # Depth-first search on a single board that undoes its changes on backtrack
+    "trail": solve_sudoku_trail,
+}
+
+
+# Solver backends that can be picked in sudoku_solver:
+# * csp - constraint propagation followed by one of the search strategies in STRATEGIES
+# * dlx - exact cover with dancing links (dlx_solver.py)
+ENGINES = ("csp", "dlx")
+
+
+def sudoku_solver(sudoku: np.array, strategy: str = "dfs", rules: Iterable[str] = RULES, engine: str = "csp", stats: SearchStats = None, return_stats: bool = False,
+                  cache: SolutionCache = None, **options) -> np.array:
+    """
+    Solves a Sudoku puzzle and returns its unique solution.
+
+    Input
+        sudoku : 9x9 numpy array
+            Empty cells are designated by 0. Bigger n^2 x n^2 boards (16x16, 25x25, ...) are solved the same way.
+        strategy : str
+            Name of the search strategy in STRATEGIES to use, depth-first search over board states by default.
+        rules : iterable of str
+            Names of the constraint propagation rules (see constraint_propagation.RULES) to use, all of them by default.
+        engine : str
+            Name of the solver backend in ENGINES, the strategy, rules and options are only used by the csp engine.
+        stats : SearchStats
+            Optional SearchStats that the solve adds its counters to and calls the hooks of (see search_stats.py).
+        return_stats : bool
+            If True, return a tuple of the solution and the SearchStats (a new one is created if stats isn't given).
+        cache : SolutionCache
+            Optional SolutionCache to look the puzzle up in first, only puzzles whose canonical form isn't cached are searched.
+        options
+            Extra keyword arguments for the strategy, e.g. variable_ordering="mrv" and value_ordering="lcv", or table_size and eviction for dfs.
+
+    Output
+        numpy array of integers with the shape of sudoku
+            It contains the solution, if there is one. If there is no solution, all array entries should be -1.
+    """
+
+    if return_stats:
+        stats = stats if stats is not None else SearchStats()
+        return sudoku_solver(sudoku, strategy, rules, engine, stats, cache=cache, **options), stats
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {list(ENGINES)}")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', expected one of {list(STRATEGIES)}")
+
+    # On a cache miss the canonical form of the puzzle is solved as usual, without the cache
+    if cache is not None:
+        return cache.solve(sudoku, lambda puzzle: sudoku_solver(puzzle, strategy, rules, engine, stats, **options))
+
+    # Perform the initial board checks
+    initial_board_setup_object = InitialBoardSetup(sudoku, rules, stats.sample_every if stats is not None else 0)
+
+    # The exact cover engine only needs the clues to not clash, it doesn't use the possible actions board
+    if engine == "dlx":
+        if not initial_board_setup_object.is_board_valid():
+            return np.full(initial_board_setup_object.board.shape, -1)
+        return solve_sudoku_dlx(initial_board_setup_object.board, stats)
+
+    # Get the output for the boards after they have been propagated and checked
+    init_output = initial_board_setup_object.get_changed_boards()
+    if stats is not None:
+        stats.add_propagation(initial_board_setup_object.constraint_propagation)
+    # If we get an output of None it means our board has failed the is_valid check so we need to stop here as there isn't a solution
+    if init_output is None:
+        return np.full(initial_board_setup_object.board.shape, -1)
+
+    # If our board is valid we have a board and possible actions board output
+    board, possible_actions_board = init_output
+    # Solve the sudoku in a iterative manner
+    solved_sudoku = STRATEGIES[strategy](board, possible_actions_board, rules=rules, stats=stats, **options)
+
+    return solved_sudoku
+
+
+def count_solutions(sudoku: np.array, limit: int = None, rules: Iterable[str] = RULES, stats: SearchStats = None, **options) -> int:
+    """
+    Count the solutions of a puzzle, with the same board checks and propagation as sudoku_solver.
+    This uses the trail search rather than solve_sudoku, as it tries every value of a cell exactly once so each solution
+    is reached by a single path and no table of seen boards is needed. It stops as soon as limit solutions have been found.
+
+    :param sudoku: n x n numpy array, 0 for empty cells
+    :param limit: number of solutions to stop at, e.g. 2 to tell unique puzzles apart, or None to count every solution
+    :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) to use
+    :param stats: SearchStats to record the search in, or None to not record anything
+    :param options: extra keyword arguments for the trail search, e.g. variable_ordering="row_major"
+    :return: number of solutions, at most limit (0 for invalid or unsolvable puzzles)
+    """
+
+    # Checked before the board checks so a bad limit is reported for every puzzle, not only the ones that get searched
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit has to be at least 1 or None, got {limit}")
+    initial_board_setup_object = InitialBoardSetup(sudoku, rules, stats.sample_every if stats is not None else 0)
+    init_output = initial_board_setup_object.get_changed_boards()
+    if stats is not None:
+        stats.add_propagation(initial_board_setup_object.constraint_propagation)
+    if init_output is None:
+        return 0
+
+    board, possible_actions_board = init_output
+    return count_solutions_trail(board, possible_actions_board, limit, rules=rules, stats=stats, **options)
+
+
+def is_unique(sudoku: np.array, rules: Iterable[str] = RULES, **options) -> bool:
+    """
+    :param sudoku: n x n numpy array, 0 for empty cells
+    :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) to use
+    :param options: extra keyword arguments for count_solutions
+    :return: boolean saying whether the puzzle has exactly one solution, the search stops at the second one
+    """
+
+    return count_solutions(sudoku, limit=2, rules=rules, **options) == 1
@@ -1,23 +1,38 @@
 import numpy as np
 from typing import Tuple
-from board_functions import BoardFunctions
-import copy
+from board_functions import BoardFunctions, box_size_of
+from constraint_propagation import ConstraintPropagation
+from transposition_table import zobrist_hash, zobrist_keys
 
 
 class SudokuBoardState:
 
-    def __init__(self, current_pos: Tuple[int, int], board: np.array, possible_actions_board: list):
+    def __init__(self, current_pos: Tuple[int, int], board: np.array, possible_actions_board: np.array, constraint_propagation: ConstraintPropagation = None, depth: int = 0, zobrist_key: int = None,
+                 variable_ordering: str = "row_major", value_ordering: str = "natural"):
         """
         Sets the local values according to the inputted parameters
 
         :param current_pos: tuple in form ({row}, {column})
-        :param board: numpy array of a n x n int board or grid in range [1..9]
-        :param possible_actions_board: a 3D list such that for each possible_actions_board[{row}][{column}] we get a list of numbers we can input on the board at that position
+        :param board: numpy array of a n x n int board or grid in range [1..n]
+        :param possible_actions_board: numpy array of a n x n candidate bitmasks, bit (n - 1) of possible_actions_board[{row}][{column}] is set if we can input n at that position
+        :param constraint_propagation: propagation engine used for new states, shared with the child states (all rules for the board's size by default)
+        :param depth: number of choices made by the search to reach this state
+        :param zobrist_key: Zobrist hash of the board, hashed from scratch if not given
+        :param variable_ordering: how the next cell to branch on is picked, one of search_heuristics.VARIABLE_ORDERINGS (shared with the child states)
+        :param value_ordering: how the values of that cell are ordered, one of search_heuristics.VALUE_ORDERINGS (shared with the child states)
         """
         self.current_pos = current_pos
         self.board = board
         self.possible_actions_board = possible_actions_board
-        self.board_functions = BoardFunctions()
+        # Child states share their parent's engine, so only the first state has to work out the box size of the board
+        if constraint_propagation is None:
+            constraint_propagation = ConstraintPropagation(box_size=box_size_of(board))
+        self.constraint_propagation = constraint_propagation
+        self.board_functions = BoardFunctions(constraint_propagation.geometry.box_size)
+        self.depth = depth
+        self.zobrist_key = zobrist_key if zobrist_key is not None else zobrist_hash(board)
+        self.variable_ordering = variable_ordering
+        self.value_ordering = value_ordering
 
     def get_board(self):
         return self.board
@@ -28,27 +43,39 @@ class SudokuBoardState:
 
         :param pos: tuple in form ({row}, {column})
         :param n: int that represents what value we should put in the cell at the specified position
-        :return: new SudokuBoardState that represents the board and possible_actions_board after our cell assignment
+        :return: new SudokuBoardState that represents the board and possible_actions_board after our cell assignment, or None if the assignment leads to a contradiction
         """
         row, column = pos
 
-        # As python is pass by reference we need to copy arrays when we make changes to them so that the original arrays are not changed when the copied arrays are changed
-        new_board = copy.copy(self.board)
-        # As possible_actions_board is 3D we need a deep copy for it not to change the original array it copied from
-        new_possible_actions_board = copy.deepcopy(self.possible_actions_board)
-
-        # Assign the cell we are exploring to the value and make sure we can't pick any other values for that cell anymore
-        new_board[row][column] = n
-        new_possible_actions_board[row][column] = []
-
-        # Propagate the effect of the assignment
-        new_board, new_possible_actions_board = self.board_functions.propagate(new_board, new_possible_actions_board, (row, column), n)
-
-        # Check for only 1 possible remaining options (if there is only one option for a cell - pick that option)
-        new_board, new_possible_actions_board = self.board_functions.deal_with_1_picks(new_board, new_possible_actions_board)
+        # The propagation engine works on flat lists, which are also new copies so the original arrays are not changed
+        new_board = self.board.ravel().tolist()
+        new_possible_actions_board = self.possible_actions_board.ravel().tolist()
+
+        # Every value written to the board, by the assignment or by propagation, is XORed into the parent's hash
+        # so the new hash costs one operation per assigned cell instead of hashing the whole board again
+        # (eliminations write 0 to an empty cell, which has a key of 0 and leaves the hash alone)
+        zobrist_key = self.zobrist_key
+        keys = zobrist_keys(self.board_functions.geometry.box_size)
+
+        def set_cell(index: int, value: int, mask: int):
+            nonlocal zobrist_key
+            zobrist_key ^= keys[index][value]
+            new_board[index] = value
+            new_possible_actions_board[index] = mask
+
+        # Assign the cell we are exploring and propagate the effect of the assignment until the propagation rules can't make any more progress
+        propagated = self.constraint_propagation.propagate(new_board, new_possible_actions_board, [(row * self.board_functions.geometry.size + column, n)], set_cell)
+        # The new state would be a dead end, so don't create it at all
+        if propagated is None:
+            return None
 
-        return SudokuBoardState(current_pos=pos, board=new_board, possible_actions_board=new_possible_actions_board)
+        new_board, new_possible_actions_board = propagated
 
+        new_board = np.array(new_board, dtype=self.board.dtype).reshape(self.board.shape)
+        new_possible_actions_board = np.array(new_possible_actions_board, dtype=self.possible_actions_board.dtype).reshape(self.possible_actions_board.shape)
+        return SudokuBoardState(current_pos=pos, board=new_board, possible_actions_board=new_possible_actions_board,
+                                constraint_propagation=self.constraint_propagation, depth=self.depth + 1, zobrist_key=zobrist_key,
+                                variable_ordering=self.variable_ordering, value_ordering=self.value_ordering)
 
     def is_goal_state(self) -> bool:
         """
@@ -57,6 +84,9 @@ class SudokuBoardState:
 
         :return: boolean confirming if the board is in the goal state
         """
+        # The other orderings don't fill the board in order, so the whole board has to be checked
+        if self.variable_ordering != "row_major":
+            return not (self.board == 0).any()
         return self._find_next_pos() is None
 
     def _find_next_pos(self) -> Tuple[int, int]:
@@ -67,6 +97,9 @@ class SudokuBoardState:
         :return: tuple in form ({row}, {column})
         """
 
+        if self.variable_ordering != "row_major":
+            return self._most_constrained_pos()
+
         # Given our current position, find the next unassigned position (i.e. board[r][c] == 0)
         row, column = self.current_pos
 
@@ -76,16 +109,40 @@ class SudokuBoardState:
             if self.board[row][c+column] == 0:
                 return row, c+column
 
-        # We already searched current row so search normally on the remaining rows
-        how_many_rows_left = len(self.board) - row - 1
-        if how_many_rows_left > 0:
-            for r in range(how_many_rows_left):
-                for c in range(len(self.board[0])):
-                    if self.board[r+row][c] == 0:
-                        return r+row, c
+        # We already searched current row so search normally on the rows after it
+        for r in range(row + 1, len(self.board)):
+            for c in range(len(self.board[0])):
+                if self.board[r][c] == 0:
+                    return r, c
 
         return None
 
+    def _most_constrained_pos(self) -> Tuple[int, int]:
+        """
+        Look for the unassigned cell with the fewest options left (ties go to the first cell in row-major order),
+        with the mrv_degree ordering breaking ties by the number of unassigned peers instead
+
+        :return: tuple in form ({row}, {column}), or None if every cell is assigned
+        """
+
+        geometry = self.board_functions.geometry
+        board = self.board.ravel().tolist()
+        empty = [cell for cell, value in enumerate(board) if value == 0]
+        if not empty:
+            return None
+
+        popcount = geometry.popcount
+        # Reading python ints from lists is much quicker than indexing numpy scalars one at a time
+        masks = self.possible_actions_board.ravel().tolist()
+        counts = [popcount[masks[cell]] for cell in empty]
+        fewest = min(counts)
+        cells = [cell for cell, count in zip(empty, counts) if count == fewest]
+        cell = cells[0]
+        if self.variable_ordering == "mrv_degree":
+            # max keeps the first of equal degrees, so ties still go to the first cell in row-major order
+            cell = max(cells, key=lambda c: sum(1 for peer in geometry.peers[c] if board[peer] == 0))
+        return divmod(cell, geometry.size)
+
     def possible_actions(self) -> Tuple[Tuple[int, int], list]:
         """
         Find the next unassigned cell in the board and then get the possible actions at that position
@@ -99,4 +156,11 @@ class SudokuBoardState:
             return None
 
         r, c = next_pos
-        return (r, c), self.possible_actions_board[r][c]
+        values = self.board_functions.candidate_values(self.possible_actions_board[r, c])
+        if self.value_ordering == "lcv":
+            # The search tries the last value first, so the least constraining value (fewest peers losing it) goes last
+            size = self.board_functions.geometry.size
+            masks = self.possible_actions_board.ravel().tolist()
+            peer_masks = [masks[peer] for peer in self.board_functions.geometry.peers[r * size + c]]
+            values = sorted(values, key=lambda n: sum(mask >> (n - 1) & 1 for mask in peer_masks), reverse=True)
+        return (r, c), values
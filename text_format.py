@@ -0,0 +1,229 @@
+import argparse
+import gzip
+import os
+import sys
+import time
+import numpy as np
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable, Iterator
+from batch_solver import solve_batch
+from solver import sudoku_solver
+
+# Byte value to cell value: '1' to '9' are the digits, '.' and '0' are empty cells, anything else is -1 (invalid)
+_CELL_VALUES = np.full(256, -1, dtype=np.int8)
+_CELL_VALUES[ord("1"):ord("9") + 1] = np.arange(1, 10)
+_CELL_VALUES[ord(".")] = 0
+_CELL_VALUES[ord("0")] = 0
+# Cell value to byte, empty cells (and -1s in a board that isn't all -1) are written as '.'
+_CELL_CHARACTERS = np.frombuffer(b".123456789", dtype=np.uint8)
+# Line written for a puzzle without a solution (all -1), a line of dots would read back as an empty puzzle
+NO_SOLUTION = b"x" * 81
+
+
+@contextmanager
+def open_puzzle_file(path: str, mode: str = "r"):
+    """
+    Open a puzzle text file in binary mode, gzip compressed if its name ends in .gz, or stdin/stdout if it is "-"
+
+    :param path: path of the file
+    :param mode: "r" to read or "w" to write
+    :return: context manager giving the binary file object
+    """
+
+    if path == "-":
+        yield sys.stdin.buffer if mode == "r" else sys.stdout.buffer
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, mode + "b") as f:
+        yield f
+
+
+def parse_lines(lines: Iterable[bytes], line_numbers: list = None) -> np.array:
+    """
+    Parse lines of 81 characters into boards, '.' or '0' being empty cells, NO_SOLUTION lines become boards of -1
+
+    :param lines: the lines as bytes, with or without their line ending
+    :param line_numbers: line number of every line in its file for error messages, or None to count from 1
+    :return: numpy array of shape (lines, 9, 9) and dtype int8
+    """
+
+    lines = [line.strip() for line in lines]
+    line_numbers = line_numbers if line_numbers is not None else range(1, len(lines) + 1)
+    for number, line in zip(line_numbers, lines):
+        if len(line) != 81:
+            raise ValueError(f"Line {number} has {len(line)} characters, expected 81")
+
+    boards = _CELL_VALUES[np.frombuffer(b"".join(lines), dtype=np.uint8)].reshape(len(lines), 9, 9)
+    # 'x' isn't in the table, so the NO_SOLUTION lines are already all -1 and only need leaving out of the check
+    no_solution = np.array([line == NO_SOLUTION for line in lines], dtype=bool)
+    invalid = (boards == -1).any(axis=(1, 2)) & ~no_solution
+    if invalid.any():
+        raise ValueError(f"Line {line_numbers[int(np.argmax(invalid))]} has a character other than 1-9, '.' or '0'")
+    return boards
+
+
+def format_boards(boards: np.array) -> bytes:
+    """
+    :param boards: numpy array of shape (N, 9, 9), 0 or -1 for cells to leave empty
+    :return: one line of 81 characters per board, puzzles without a solution (all -1) become a NO_SOLUTION line
+    """
+
+    cells = np.asarray(boards).reshape(len(boards), 81)
+    lines = np.empty((len(boards), 82), dtype=np.uint8)
+    lines[:, :81] = _CELL_CHARACTERS[np.maximum(cells, 0)]
+    lines[(cells == -1).all(axis=1), :81] = ord("x")
+    lines[:, 81] = ord("\n")
+    return lines.tobytes()
+
+
+def read_puzzles(path: str, chunk_size: int = 10000) -> Iterator[np.array]:
+    """
+    Read a file of one 81 character puzzle per line a chunk at a time, so only chunk_size lines are in memory at once.
+    Empty lines and lines starting with '#' are skipped.
+
+    :param path: path of the text file (gzip compressed if it ends in .gz, stdin if it is "-")
+    :param chunk_size: number of puzzles in each chunk
+    :return: generator of numpy arrays of shape (chunk_size, 9, 9) and dtype int8, the last one may be smaller
+    """
+
+    with open_puzzle_file(path) as f:
+        # Pair every line with its number so errors can point at the right line even after skipped lines
+        numbered_lines = ((number, line) for number, line in enumerate(f, 1) if line.strip() and not line.startswith(b"#"))
+        while True:
+            chunk = list(islice(numbered_lines, chunk_size))
+            if not chunk:
+                return
+            # Lines are checked one chunk at a time, an error in a later chunk is only found when that chunk is read
+            line_numbers, lines = zip(*chunk)
+            yield parse_lines(lines, line_numbers)
+
+
+def write_puzzles(path: str, chunks: Iterable[np.array]) -> int:
+    """
+    Write boards as one 81 character line each, a chunk at a time
+
+    :param path: path of the text file (gzip compressed if it ends in .gz, stdout if it is "-")
+    :param chunks: iterable of numpy arrays of shape (N, 9, 9)
+    :return: number of boards written
+    """
+
+    written = 0
+    with open_puzzle_file(path, "w") as f:
+        for boards in chunks:
+            f.write(format_boards(boards))
+            written += len(boards)
+    return written
+
+
+def solve_text_file(input_path: str, output_path: str, chunk_size: int = 10000, batch: bool = True, strategy: str = "trail", **options) -> dict:
+    """
+    Solve every puzzle of a text file and write the solutions to another text file in the same order, streaming both so
+    memory use depends on chunk_size rather than on the size of the files. Puzzles without a solution get a NO_SOLUTION line.
+
+    :param input_path: path of the text file of puzzles
+    :param output_path: path of the text file to write the solutions to (overwritten)
+    :param chunk_size: number of puzzles read, solved and written at a time
+    :param batch: whether to solve each chunk with solve_batch, otherwise every puzzle is solved with sudoku_solver
+    :param strategy: name of the strategy in solver.STRATEGIES
+    :param options: extra keyword arguments for the solver
+    :return: summary dictionary with the number of puzzles, how many were unsolvable and the throughput
+    """
+
+    unsolvable = 0
+
+    def solved_chunks():
+        nonlocal unsolvable
+        for puzzles in read_puzzles(input_path, chunk_size):
+            if batch:
+                solutions = solve_batch(puzzles, strategy=strategy, **options)
+            else:
+                solutions = np.array([sudoku_solver(puzzle, strategy=strategy, **options) for puzzle in puzzles])
+            unsolvable += int((solutions == -1).all(axis=(1, 2)).sum())
+            yield solutions
+
+    start_time = time.perf_counter()
+    puzzles = write_puzzles(output_path, solved_chunks())
+    wall_time = time.perf_counter() - start_time
+    return {
+        "puzzles": puzzles,
+        "unsolvable": unsolvable,
+        "wall_time": wall_time,
+        "puzzles_per_second": puzzles / wall_time if wall_time > 0 else 0.0,
+    }
+
+
+def text_to_npy(text_path: str, npy_path: str, chunk_size: int = 100000) -> int:
+    """
+    Convert a text file of puzzles to a (N, 9, 9) int8 .npy file like data/*_puzzle.npy.
+    The text is read twice, once to count the puzzles and once to fill a memory-mapped output, so the whole file is never in memory.
+
+    :param text_path: path of the text file (gzip compressed if it ends in .gz), it has to be a regular file that can be read twice
+    :param npy_path: path of the .npy file to write (overwritten)
+    :param chunk_size: number of puzzles converted at a time
+    :return: number of puzzles converted
+    """
+
+    # Reading stdin or a pipe a second time gives nothing, which would leave the .npy file full of zeros
+    if text_path == "-" or not os.path.isfile(text_path):
+        raise ValueError(f"text_to_npy reads its input twice, so it has to be a regular file, not '{text_path}'")
+    count = sum(len(puzzles) for puzzles in read_puzzles(text_path, chunk_size))
+    output = np.lib.format.open_memmap(npy_path, mode="w+", dtype=np.int8, shape=(count, 9, 9))
+    start = 0
+    for puzzles in read_puzzles(text_path, chunk_size):
+        output[start:start + len(puzzles)] = puzzles
+        start += len(puzzles)
+    output.flush()
+    return count
+
+
+def npy_to_text(npy_path: str, text_path: str, chunk_size: int = 100000) -> int:
+    """
+    Convert a (N, 9, 9) .npy file like data/*_puzzle.npy or data/*_solution.npy to a text file of one board per line.
+    The .npy file is memory-mapped, so only one chunk of it is read at a time.
+
+    :param npy_path: path of the .npy file
+    :param text_path: path of the text file to write (gzip compressed if it ends in .gz, overwritten)
+    :param chunk_size: number of boards converted at a time
+    :return: number of boards converted
+    """
+
+    boards = np.load(npy_path, mmap_mode="r")
+    # Solution files may be stored as floats, so every chunk is turned into integers before it is formatted
+    return write_puzzles(text_path, (boards[start:start + chunk_size].astype(np.int8) for start in range(0, len(boards), chunk_size)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve and convert puzzle files with one 81 character puzzle per line ('.' or '0' for empty cells, .gz for gzip)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    solve_parser = subparsers.add_parser("solve", help="solve every puzzle of a text file into another text file")
+    solve_parser.add_argument("input", help="path of the text file of puzzles, - for stdin")
+    solve_parser.add_argument("output", help="path of the text file to write the solutions to, - for stdout")
+    solve_parser.add_argument("--chunk-size", type=int, default=10000, help="number of puzzles read, solved and written at a time")
+    solve_parser.add_argument("--single", action="store_true", help="solve the puzzles one at a time with sudoku_solver instead of solve_batch")
+    solve_parser.add_argument("--strategy", default="trail", help="search strategy of sudoku_solver")
+
+    to_npy_parser = subparsers.add_parser("to-npy", help="convert a text file to a .npy file")
+    to_npy_parser.add_argument("input", help="path of the text file, not stdin as it is read twice")
+    to_npy_parser.add_argument("output", help="path of the .npy file to write")
+
+    to_text_parser = subparsers.add_parser("to-text", help="convert a .npy file to a text file")
+    to_text_parser.add_argument("input", help="path of the .npy file")
+    to_text_parser.add_argument("output", help="path of the text file to write, - for stdout")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.command == "solve":
+        summary = solve_text_file(args.input, args.output, args.chunk_size, not args.single, args.strategy)
+        # Keep stdout clean for the solutions when they are written there
+        print(f"Solved {summary['puzzles']} puzzles in {summary['wall_time']:.3f} seconds ({summary['puzzles_per_second']:.0f} puzzles/s), "
+              f"{summary['unsolvable']} unsolvable", file=sys.stderr)
+        return
+    count = text_to_npy(args.input, args.output) if args.command == "to-npy" else npy_to_text(args.input, args.output)
+    wall_time = time.perf_counter() - start_time
+    print(f"Converted {count} puzzles in {wall_time:.3f} seconds ({count / wall_time:.0f} puzzles/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
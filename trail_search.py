@@ -0,0 +1,255 @@
+import numpy as np
+from typing import Iterable, Iterator
+from board_functions import box_size_of
+from constraint_propagation import ConstraintPropagation, RULES
+from search_heuristics import VARIABLE_ORDERINGS, VALUE_ORDERINGS
+from search_stats import SearchStats
+
+
+class TrailSearch:
+    """
+    Depth-first search that works on a single mutable board and possible actions board instead of copying a state per child.
+    Every change made by an assignment or its propagation is pushed onto a trail, and backtracking pops the trail to undo them.
+    This means memory only grows with the depth of the search rather than the width of the frontier.
+    """
+
+    def __init__(self, board: np.array, possible_actions_board: np.array, variable_ordering: str = "row_major", value_ordering: str = "natural", rules: Iterable[str] = RULES, stats: SearchStats = None):
+        """
+        Flatten the boards into python lists, as single cell reads and writes on lists are much quicker than on numpy arrays
+
+        :param board: numpy array of a n x n int board or grid in range [1..n]
+        :param possible_actions_board: numpy array of a n x n candidate bitmasks
+        :param variable_ordering: name of the function in VARIABLE_ORDERINGS used to pick the cell to branch on
+        :param value_ordering: name of the function in VALUE_ORDERINGS used to order the values tried for that cell
+        :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) applied after every assignment
+        :param stats: SearchStats to record the search in, or None to not record anything
+        """
+        if variable_ordering not in VARIABLE_ORDERINGS:
+            raise ValueError(f"Unknown variable ordering '{variable_ordering}', expected one of {list(VARIABLE_ORDERINGS)}")
+        if value_ordering not in VALUE_ORDERINGS:
+            raise ValueError(f"Unknown value ordering '{value_ordering}', expected one of {list(VALUE_ORDERINGS)}")
+
+        self.shape = board.shape
+        self.dtype = board.dtype
+        self.size = len(board)
+        self.board = [int(value) for value in board.ravel()]
+        self.possible_actions_board = [int(mask) for mask in possible_actions_board.ravel()]
+        self.select_cell = VARIABLE_ORDERINGS[variable_ordering]
+        self.order_values = VALUE_ORDERINGS[value_ordering]
+        self.stats = stats
+        self.constraint_propagation = ConstraintPropagation(rules, sample_every=stats.sample_every if stats is not None else 0, box_size=box_size_of(board))
+        # The index tables of the board size, also used by the orderings in search_heuristics.py
+        self.geometry = self.constraint_propagation.geometry
+        self.popcount = self.geometry.popcount
+        # Each entry is (cell index, board value, candidate bitmask) as they were before the cell was changed
+        self.trail = []
+
+        # Unassigned cells grouped by how many options they have left, kept up to date on every change so that
+        # minimum remaining values orderings don't have to count the options of every cell at every node
+        self.buckets = [set() for _ in range(self.size + 1)]
+        for index, value in enumerate(self.board):
+            if value == 0:
+                self.buckets[self.popcount[self.possible_actions_board[index]]].add(index)
+
+    def _set_cell(self, index: int, value: int, mask: int):
+        """
+        Record the current contents of a cell on the trail and then overwrite them
+
+        :param index: flat cell index (row * size + column)
+        :param value: new board value of the cell
+        :param mask: new candidate bitmask of the cell
+        """
+
+        old_value = self.board[index]
+        old_mask = self.possible_actions_board[index]
+        self.trail.append((index, old_value, old_mask))
+        self._move_bucket(index, old_value, old_mask, value, mask)
+        self.board[index] = value
+        self.possible_actions_board[index] = mask
+
+    def _move_bucket(self, index: int, old_value: int, old_mask: int, value: int, mask: int):
+        """
+        Move a cell to the bucket matching its new number of options, or out of the buckets once it is assigned
+
+        :param index: flat cell index (row * size + column)
+        :param old_value: board value of the cell before the change
+        :param old_mask: candidate bitmask of the cell before the change
+        :param value: board value of the cell after the change
+        :param mask: candidate bitmask of the cell after the change
+        """
+
+        if old_value == 0:
+            self.buckets[self.popcount[old_mask]].discard(index)
+        if value == 0:
+            self.buckets[self.popcount[mask]].add(index)
+
+    def _undo(self, trail_length: int):
+        """
+        Pop the trail until it is back to the given length, restoring every cell that was changed after that point
+
+        :param trail_length: length of the trail when the choice we are backtracking from was made
+        """
+
+        trail = self.trail
+        board = self.board
+        possible_actions_board = self.possible_actions_board
+        while len(trail) > trail_length:
+            index, value, mask = trail.pop()
+            self._move_bucket(index, board[index], possible_actions_board[index], value, mask)
+            board[index] = value
+            possible_actions_board[index] = mask
+
+    def _assign(self, index: int, n: int) -> bool:
+        """
+        Assign n to a cell and propagate the effect until the propagation rules can't make any more progress,
+        every change goes through _set_cell so it is recorded on the trail.
+
+        :param index: flat cell index (row * size + column)
+        :param n: value to put in the cell
+        :return: boolean saying whether the assignment was propagated without finding a contradiction
+        """
+
+        return self.constraint_propagation.propagate(self.board, self.possible_actions_board, [(index, n)], self._set_cell) is not None
+
+    def solve(self) -> np.array:
+        """
+        Run the search until it finds the first solution
+
+        :return: the solved sudoku or an array filled with -1 indicating we couldn't find a solution
+        """
+
+        for solution in self.solutions():
+            return self._finish(solution)
+        return self._finish(np.full(self.shape, -1))
+
+    def count(self, limit: int = None) -> int:
+        """
+        Run the search past every solution it finds, stopping early once limit solutions have been found
+
+        :param limit: number of solutions to stop at, e.g. 2 to check that a puzzle has a unique solution, or None to count them all
+        :return: number of solutions found, at most limit
+        """
+
+        # The limit is only checked once a solution has been counted, so a limit of 0 would still count one
+        if limit is not None and limit < 1:
+            raise ValueError(f"limit has to be at least 1 or None, got {limit}")
+        found = 0
+        for _ in self.solutions():
+            found += 1
+            if limit is not None and found >= limit:
+                break
+        self._finish(None)
+        return found
+
+    def solutions(self) -> Iterator[np.array]:
+        """
+        Run the search, each stack entry is a cell we are branching on, the values we still have to try for it
+        and the trail length to undo to before trying the next value.
+        Every time all cells are assigned the board is yielded, and the search carries on from there when asked for the next one.
+
+        :return: generator of the solutions in the order the search finds them
+        """
+
+        stats = self.stats
+        index = self.select_cell(self, 0)
+        if index is None:
+            yield self._to_array()
+            return
+
+        stack = [self._branch(index, 0)]
+        while stack:
+            index, values, trail_length = stack[-1]
+            # No values left to try for this cell so backtrack to the previous choice
+            if not values:
+                stack.pop()
+                if stats is not None:
+                    stats.backtrack(divmod(index, self.size), len(stack))
+                continue
+
+            self._undo(trail_length)
+            n = values.pop()
+            if stats is not None:
+                stats.assign(divmod(index, self.size), n, len(stack) - 1)
+            # The value leads to a contradiction, so move straight on to the next value
+            if not self._assign(index, n):
+                if stats is not None:
+                    stats.contradiction(divmod(index, self.size), n, len(stack) - 1)
+                continue
+
+            next_index = self.select_cell(self, index)
+            if next_index is None:
+                yield self._to_array()
+                continue
+            stack.append(self._branch(next_index, len(stack)))
+
+    def _branch(self, index: int, depth: int) -> tuple:
+        """
+        :param index: flat cell index to branch on
+        :param depth: number of choices made so far
+        :return: stack entry of the cell, the values to try for it and the current trail length
+        """
+
+        values = self._values(index)
+        if self.stats is not None:
+            self.stats.expand(divmod(index, self.size), values[::-1], depth)
+            self.stats.frontier_size(depth + 1)
+        return index, values, len(self.trail)
+
+    def _finish(self, solution: np.array) -> np.array:
+        """
+        :param solution: the array solve is about to return (None when counting)
+        :return: the same array, after adding the propagation counters to the stats
+        """
+
+        if self.stats is not None:
+            self.stats.add_propagation(self.constraint_propagation)
+        return solution
+
+    def _values(self, index: int) -> list:
+        """
+        :param index: flat cell index
+        :return: values to try at the cell, reversed so that popping from the end tries them in the value ordering's order
+        """
+
+        return self.order_values(self, index)[::-1]
+
+    def _to_array(self) -> np.array:
+        """
+        :return: the current board as a numpy array with the same shape and dtype as the input board
+        """
+
+        return np.array(self.board, dtype=self.dtype).reshape(self.shape)
+
+
+def solve_sudoku_trail(board: np.array, possible_actions_board: np.array, variable_ordering: str = "row_major", value_ordering: str = "natural", rules: Iterable[str] = RULES, stats: SearchStats = None) -> np.array:
+    """
+    Solve a set up board with the in-place TrailSearch, takes the same arguments as solve_sudoku so they can be swapped
+
+    :param board: numpy array of a n x n int board or grid in range [1..n]
+    :param possible_actions_board: numpy array of a n x n candidate bitmasks
+    :param variable_ordering: name of the function in VARIABLE_ORDERINGS used to pick the cell to branch on
+    :param value_ordering: name of the function in VALUE_ORDERINGS used to order the values tried for that cell
+    :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) applied after every assignment
+    :param stats: SearchStats to record the search in, or None to not record anything
+    :return: the solved sudoku or an array filled with -1 indicating we couldn't find a solution
+    """
+
+    return TrailSearch(board, possible_actions_board, variable_ordering, value_ordering, rules, stats).solve()
+
+
+def count_solutions_trail(board: np.array, possible_actions_board: np.array, limit: int = None, variable_ordering: str = "mrv", value_ordering: str = "natural", rules: Iterable[str] = RULES, stats: SearchStats = None) -> int:
+    """
+    Count the solutions of a set up board with the in-place TrailSearch.
+    Propagation only removes options that can't be part of any solution, so counting on the propagated board is exact.
+
+    :param board: numpy array of a n x n int board or grid in range [1..n]
+    :param possible_actions_board: numpy array of a n x n candidate bitmasks
+    :param limit: number of solutions to stop at, or None to count them all
+    :param variable_ordering: name of the function in VARIABLE_ORDERINGS used to pick the cell to branch on, MRV by default as counting searches the whole tree
+    :param value_ordering: name of the function in VALUE_ORDERINGS used to order the values tried for that cell
+    :param rules: names of the constraint propagation rules (see constraint_propagation.RULES) applied after every assignment
+    :param stats: SearchStats to record the search in, or None to not record anything
+    :return: number of solutions found, at most limit
+    """
+
+    return TrailSearch(board, possible_actions_board, variable_ordering, value_ordering, rules, stats).count(limit)
@@ -0,0 +1,105 @@
+import random
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from board_functions import box_size_of
+
+# Eviction policies of the TranspositionTable once it is full:
+# * lru - forget the state that was added or looked up the longest time ago
+# * depth - forget the deepest state, as states close to the root have the biggest subtrees to search again
+EVICTIONS = ("lru", "depth")
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(box_size: int = 3) -> list:
+    """
+    Random 64-bit key for every (cell index, value) pair, the hash of a board is the XOR of the keys of its assigned cells.
+    Empty cells have a key of 0 so they don't change the hash. A fixed seed keeps the hashes the same between runs.
+
+    :param box_size: width and height of a box, 3 for 9 x 9 boards
+    :return: list indexed by [cell index][value], built on the first call for each box size and shared afterwards
+    """
+
+    size = box_size * box_size
+    generator = random.Random(size)
+    return [[0] + [generator.getrandbits(64) for _ in range(size)] for _ in range(size * size)]
+
+
+def zobrist_hash(board: np.array) -> int:
+    """
+    Hash a whole board from scratch, only needed for the starting board as children update their parent's hash
+
+    :param board: numpy array of a n x n int board or grid in range [1..n], 0 for empty cells
+    :return: 64-bit Zobrist hash of the board
+    """
+
+    keys = zobrist_keys(box_size_of(board))
+    key = 0
+    for index, value in enumerate(board.ravel().tolist()):
+        key ^= keys[index][value]
+    return key
+
+
+class TranspositionTable:
+    """
+    Size-capped set of the Zobrist hashes of the states a search has already seen, with the depth each was seen at.
+    Forgetting a state only means the search might explore it again, so a full table evicts entries instead of growing.
+    """
+
+    def __init__(self, max_size: int = 100000, eviction: str = "lru"):
+        """
+        :param max_size: largest number of states the table keeps
+        :param eviction: name of the eviction policy in EVICTIONS
+        """
+        if eviction not in EVICTIONS:
+            raise ValueError(f"Unknown eviction '{eviction}', expected one of {list(EVICTIONS)}")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.eviction = eviction
+        # Hash to depth, in least recently used first order
+        self.entries = OrderedDict()
+        # Depth to the hashes stored at that depth (depth eviction only), so the deepest states can be found without scanning every entry
+        self.depths = {}
+        # Number of states forgotten to keep the table under max_size
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: int) -> bool:
+        if key not in self.entries:
+            return False
+        if self.eviction == "lru":
+            self.entries.move_to_end(key)
+        return True
+
+    def add(self, key: int, depth: int):
+        """
+        Store a state, evicting another one if the table is full
+
+        :param key: Zobrist hash of the state's board
+        :param depth: number of choices made by the search to reach the state
+        """
+
+        if key in self.entries:
+            return
+        if len(self.entries) >= self.max_size:
+            if self.eviction == "lru":
+                self.entries.popitem(last=False)
+            else:
+                deepest = max(self.depths)
+                # A state deeper than everything stored is worth less than any of them, so don't store it at all
+                if depth > deepest:
+                    return
+                keys = self.depths[deepest]
+                old_key = next(iter(keys))
+                del keys[old_key]
+                if not keys:
+                    del self.depths[deepest]
+                del self.entries[old_key]
+            self.evictions += 1
+
+        self.entries[key] = depth
+        if self.eviction == "depth":
+            self.depths.setdefault(depth, {})[key] = None